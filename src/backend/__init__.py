@@ -1,20 +1,48 @@
-from .models import IsingSim
-from .faction_utils import initialize_factions, generate_h_values, generate_h_map
+from .models import IsingSim, GraphIsingSim
+from .faction_utils import initialize_factions, reaction_diffusion_factions, generate_pattern, generate_h_values, generate_h_map, build_faction_index, faction_boundary_mask, faction_borders
 from .energy_utils import get_energy_faction, get_total_energy
-from .state_utils import get_spin_percentages, get_magnetization, get_agreement_score, StateManager
+from .state_utils import get_spin_percentages, get_magnetization, get_agreement_score, StateManager, FrameEncoder
 from .event_utils import inject_event, create_decay_schedule
+from .downsample_utils import lttb, minmax_envelope
+from .analysis_utils import integrated_autocorr_time, AutocorrelationTracker, EquilibrationDetector
+from .accumulator_utils import Welford, LogBinning, BlockJackknife, ThermoAccumulator
+from .graph_utils import csr_from_edges, lattice_graph, small_world_graph, scale_free_graph, graph_factions, graph_total_energy
+from .compile_utils import warmup
 
 __all__ = [
     'IsingSim',
+    'GraphIsingSim',
     'initialize_factions',
+    'reaction_diffusion_factions',
+    'generate_pattern',
     'generate_h_values',
     'generate_h_map',
+    'build_faction_index',
+    'faction_boundary_mask',
+    'faction_borders',
     'get_energy_faction',
     'get_total_energy',
     'get_spin_percentages',
     'get_magnetization',
     'get_agreement_score',
     'StateManager',
+    'FrameEncoder',
     'inject_event',
-    'create_decay_schedule'
+    'create_decay_schedule',
+    'lttb',
+    'minmax_envelope',
+    'integrated_autocorr_time',
+    'AutocorrelationTracker',
+    'EquilibrationDetector',
+    'Welford',
+    'LogBinning',
+    'BlockJackknife',
+    'ThermoAccumulator',
+    'csr_from_edges',
+    'lattice_graph',
+    'small_world_graph',
+    'scale_free_graph',
+    'graph_factions',
+    'graph_total_energy',
+    'warmup'
 ] 
\ No newline at end of file
@@ -0,0 +1,155 @@
+import numpy as np
+
+class Welford:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def push(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+class LogBinning:
+    # Level k holds a Welford accumulator over bins of 2**k consecutive samples, so the
+    # whole binning analysis costs O(levels) memory however long the run is.
+    def __init__(self, levels=48, min_bins=32):
+        self.levels = [Welford() for _ in range(levels)]
+        self.min_bins = min_bins
+        self._pending = [None] * levels
+
+    @property
+    def count(self):
+        return self.levels[0].count
+
+    @property
+    def mean(self):
+        return self.levels[0].mean
+
+    @property
+    def variance(self):
+        return self.levels[0].variance
+
+    def push(self, x):
+        for level, acc in enumerate(self.levels):
+            acc.push(x)
+            if self._pending[level] is None:
+                self._pending[level] = x
+                return
+            x = 0.5 * (self._pending[level] + x)
+            self._pending[level] = None
+
+    def level_errors(self):
+        return [np.sqrt(acc.variance / acc.count) for acc in self.levels if acc.count >= self.min_bins]
+
+    def error(self):
+        # The naive error grows with bin size until bins decorrelate; take the plateau (largest) value
+        errors = self.level_errors()
+        return max(errors) if errors else float('nan')
+
+    def tau(self):
+        errors = self.level_errors()
+        # Same 1 + 2 * sum(rho) convention as analysis_utils.integrated_autocorr_time
+        if not errors or errors[0] == 0:
+            return 1.0
+        return (max(errors) / errors[0]) ** 2
+
+class BlockJackknife:
+    # Keeps at most max_blocks block sums of a vector of samples, doubling the block size
+    # (merging neighbours) whenever they fill up, for jackknife errors of derived quantities.
+    def __init__(self, width, max_blocks=64):
+        # Full storage is merged in pairs, which needs an even count, and the jackknife needs
+        # at least two blocks left after a merge
+        if max_blocks < 4 or max_blocks % 2:
+            raise ValueError(f"max_blocks must be an even number of at least 4, got {max_blocks}")
+        self.max_blocks = max_blocks
+        self.block_size = 1
+        self.num_blocks = 0
+        self.count = 0
+        self.total = np.zeros(width)
+        self._sums = np.zeros((max_blocks, width))
+        self._partial = np.zeros(width)
+        self._partial_count = 0
+
+    def push(self, values):
+        self.count += 1
+        self.total += values
+        self._partial += values
+        self._partial_count += 1
+        if self._partial_count < self.block_size:
+            return
+        self._sums[self.num_blocks] = self._partial
+        self.num_blocks += 1
+        self._partial = np.zeros_like(self._partial)
+        self._partial_count = 0
+        if self.num_blocks == self.max_blocks:
+            half = self.max_blocks // 2
+            self._sums[:half] = self._sums[0::2] + self._sums[1::2]
+            self._sums[half:] = 0
+            self.num_blocks = half
+            self.block_size *= 2
+
+    def estimate(self, fn):
+        value = fn(self.total / self.count) if self.count else float('nan')
+        n = self.num_blocks
+        if n < 2:
+            return value, float('nan')
+        sums = self._sums[:n]
+        complete = sums.sum(axis=0)
+        leave_one_out = np.array([fn((complete - s) / ((n - 1) * self.block_size)) for s in sums])
+        error = np.sqrt((n - 1) / n * np.sum((leave_one_out - leave_one_out.mean()) ** 2))
+        return value, float(error)
+
+class ThermoAccumulator:
+    # Fed per-spin energy and magnetization, e.g. from IsingSim.iter_observables records
+    def __init__(self, num_spins, T, max_blocks=64):
+        self.num_spins = num_spins
+        self.T = T
+        self.energy = LogBinning()
+        self.magnetization = LogBinning()
+        self.abs_magnetization = LogBinning()
+        # Columns: e, e², m, m², m⁴, |m|
+        self._moments = BlockJackknife(6, max_blocks)
+
+    @property
+    def count(self):
+        return self._moments.count
+
+    def push(self, energy, magnetization):
+        self.energy.push(energy)
+        self.magnetization.push(magnetization)
+        self.abs_magnetization.push(abs(magnetization))
+        m2 = magnetization * magnetization
+        self._moments.push(np.array([energy, energy * energy, magnetization, m2, m2 * m2, abs(magnetization)]))
+
+    def update(self, record):
+        self.push(record['energy'], record['magnetization'])
+
+    def specific_heat(self):
+        return self._moments.estimate(lambda q: self.num_spins * (q[1] - q[0] ** 2) / self.T ** 2)
+
+    def susceptibility(self):
+        return self._moments.estimate(lambda q: self.num_spins * (q[3] - q[2] ** 2) / self.T)
+
+    def abs_susceptibility(self):
+        # Finite lattices flip between ±m, so <|m|> is the usual stand-in for <m> below Tc
+        return self._moments.estimate(lambda q: self.num_spins * (q[3] - q[5] ** 2) / self.T)
+
+    def binder(self):
+        return self._moments.estimate(lambda q: 1 - q[4] / (3 * q[3] ** 2) if q[3] > 0 else 0.0)
+
+    def results(self):
+        out = {'samples': self.count, 'T': self.T}
+        for name in ('energy', 'magnetization', 'abs_magnetization'):
+            acc = getattr(self, name)
+            out[name] = {'mean': acc.mean, 'error': float(acc.error()), 'variance': acc.variance, 'tau': float(acc.tau())}
+        for name in ('specific_heat', 'susceptibility', 'abs_susceptibility', 'binder'):
+            value, error = getattr(self, name)()
+            out[name] = {'mean': float(value), 'error': error}
+        return out
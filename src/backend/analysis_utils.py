@@ -0,0 +1,85 @@
+import numpy as np
+
+def autocorrelation(x):
+    x = np.asarray(x, dtype=float)
+    x = x - x.mean()
+    n = len(x)
+    # Zero-pad to a power of two >= 2n so the circular FFT correlation is not wrapped
+    size = 1 << int(2 * n - 1).bit_length()
+    f = np.fft.rfft(x, size)
+    acf = np.fft.irfft(f * np.conj(f), size)[:n]
+    if acf[0] <= 0:
+        rho = np.zeros(n)
+        rho[0] = 1.0
+        return rho
+    return acf / acf[0]
+
+def integrated_autocorr_time(x, c=5.0):
+    # Sokal's self-consistent window: the smallest M with M >= c * tau(M)
+    if len(x) < 2:
+        return 1.0
+    rho = autocorrelation(x)
+    taus = 2 * np.cumsum(rho) - 1
+    window = np.arange(len(taus)) >= c * taus
+    M = np.argmax(window) if window.any() else len(taus) - 1
+    return max(float(taus[M]), 1.0)
+
+class AutocorrelationTracker:
+    def __init__(self, window=2048):
+        self.window = window
+        self._buffer = np.empty(window)
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.window)
+
+    def push(self, value):
+        self._buffer[self._count % self.window] = value
+        self._count += 1
+
+    def values(self):
+        if self._count <= self.window:
+            return self._buffer[:self._count]
+        start = self._count % self.window
+        return np.concatenate((self._buffer[start:], self._buffer[:start]))
+
+    def tau(self, c=5.0):
+        return integrated_autocorr_time(self.values(), c)
+
+class EquilibrationDetector:
+    # A series counts as equilibrated once the sliding window holds enough independent
+    # samples and the means of its two halves agree within z standard errors, with the
+    # errors inflated by the integrated autocorrelation time.
+    def __init__(self, fields=('energy', 'magnetization'), window=2048, min_samples=64, z=2.0, decorrelations=20):
+        self.fields = tuple(fields)
+        self.trackers = {f: AutocorrelationTracker(window) for f in self.fields}
+        self.min_samples = min_samples
+        self.z = z
+        self.decorrelations = decorrelations
+        self.equilibrated = False
+        self.samples = 0
+
+    def update(self, record):
+        for field, tracker in self.trackers.items():
+            tracker.push(record[field])
+        self.samples += 1
+        if self.samples >= self.min_samples:
+            self.equilibrated = all(self._stationary(t) for t in self.trackers.values())
+        return self.equilibrated
+
+    def _stationary(self, tracker):
+        values = tracker.values()
+        n = len(values)
+        tau = integrated_autocorr_time(values)
+        if n < self.decorrelations * tau:
+            return False
+        a, b = values[:n // 2], values[n // 2:]
+        error = np.sqrt(tau * (a.var() / len(a) + b.var() / len(b)))
+        return abs(a.mean() - b.mean()) <= self.z * error
+
+    def taus(self):
+        return {field: tracker.tau() for field, tracker in self.trackers.items()}
+
+    def decorrelated_interval(self, factor=2.0):
+        # Samples this many observations apart are roughly independent
+        return int(np.ceil(factor * max(self.taus().values())))
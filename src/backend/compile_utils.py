@@ -0,0 +1,31 @@
+import time
+import numpy as np
+from .models import IsingSim
+from .energy_utils import get_total_energy
+from .downsample_utils import lttb
+
+def warmup(verbose=True):
+    # Runs every kernel once on tiny inputs so lazily compiled ones are ready
+    # (or loaded from the on-disk cache) before the first real request
+    report = {}
+
+    start = time.perf_counter()
+    sim = IsingSim(N=8, seed=0)
+    report['IsingSim'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sim.step(16)
+    report['step'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_total_energy(sim.lattice, sim.faction_map, sim.h_map, sim.J_intra, sim.J_inter)
+    report['get_total_energy'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lttb(np.arange(16), np.arange(16), 4)
+    report['lttb'] = time.perf_counter() - start
+
+    if verbose:
+        timings = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in report.items())
+        print(f"Numba warm-up: {timings}")
+    return report
@@ -0,0 +1,62 @@
+import numpy as np
+from numba import njit
+
+@njit('int64[:](float64[:], float64[:], int64)', cache=True)
+def _lttb_indices(x, y, n_out):
+    n = x.shape[0]
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[n_out - 1] = n - 1
+    bucket_size = (n - 2) / (n_out - 2)
+
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third corner of the triangle
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = 0.0
+        avg_y = 0.0
+        for j in range(next_start, next_end):
+            avg_x += x[j]
+            avg_y += y[j]
+        count = max(next_end - next_start, 1)
+        avg_x /= count
+        avg_y /= count
+
+        best = start
+        best_area = -1.0
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best_area = area
+                best = j
+        selected[i + 1] = best
+        a = best
+    return selected
+
+def lttb(x, y, n_out):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if n_out < 2:
+        raise ValueError(f"LTTB keeps both endpoints, n_out must be at least 2, got {n_out}")
+    if n_out >= x.shape[0]:
+        return x, y
+    if n_out == 2:
+        idx = np.array([0, x.shape[0] - 1])
+    else:
+        idx = _lttb_indices(x, y, n_out)
+    return x[idx], y[idx]
+
+def minmax_envelope(x, y, n_buckets):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if n_buckets < 1:
+        raise ValueError(f"n_buckets must be positive, got {n_buckets}")
+    if n_buckets >= x.shape[0]:
+        return x, y, y
+    edges = np.linspace(0, x.shape[0], n_buckets + 1).astype(int)
+    starts = edges[:-1]
+    return x[starts], np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)
@@ -1,6 +1,7 @@
+import numpy as np
 from numba import njit
 
-@njit
+@njit(cache=True)
 def get_energy_faction(row, col, flip, lattice, faction_map, h_map, J_intra, J_inter):
     N = lattice.shape[0]
     spin = lattice[row, col] * flip
@@ -17,10 +18,36 @@ def get_energy_faction(row, col, flip, lattice, faction_map, h_map, J_intra, J_i
     energy += -h_map[row, col] * spin
     return energy
 
+@njit(cache=True)
 def get_total_energy(lattice, faction_map, h_map, J_intra, J_inter):
-    total = 0
+    # Site energies see every bond from both ends, so the coupling part is halved. This is the
+    # Hamiltonian the Metropolis deltas track, and the one graph_total_energy uses.
+    total = 0.0
     N = lattice.shape[0]
     for row in range(N):
         for col in range(N):
-            total += get_energy_faction(row, col, 1, lattice, faction_map, h_map, J_intra, J_inter)
-    return total 
\ No newline at end of file
+            field = -h_map[row, col] * lattice[row, col]
+            total += 0.5 * (get_energy_faction(row, col, 1, lattice, faction_map, h_map, J_intra, J_inter) - field) + field
+    return total
+
+# Internal kernels take explicit signatures so they compile (or load from the
+# on-disk cache) at import time instead of on the first simulation step
+# counts is [attempted intra, attempted boundary, accepted intra, accepted boundary],
+# faction_accepts is accepted flips per faction; both are accumulated in place.
+@njit('float64(int64[:, :], int64[:, :], float64[:, :], boolean[:, :], float64, float64, float64, '
+      'int64[:], int64[:], float64[:], float64, float64[:], int64[:], int64[:])', nogil=True, cache=True)
+def run_metropolis(lattice, faction_map, h_map, boundary, J_intra, J_inter, T, rows, cols, rands, energy, energies_out,
+                   counts, faction_accepts):
+    for i in range(rows.shape[0]):
+        row, col = rows[i], cols[i]
+        on_boundary = 1 if boundary[row, col] else 0
+        counts[on_boundary] += 1
+        delta = (get_energy_faction(row, col, -1, lattice, faction_map, h_map, J_intra, J_inter) -
+                 get_energy_faction(row, col,  1, lattice, faction_map, h_map, J_intra, J_inter))
+        if delta <= 0 or rands[i] <= np.exp(-delta / T):
+            lattice[row, col] *= -1
+            energy += delta
+            counts[2 + on_boundary] += 1
+            faction_accepts[faction_map[row, col]] += 1
+        energies_out[i] = energy
+    return energy
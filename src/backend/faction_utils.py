@@ -1,33 +1,145 @@
 import numpy as np
+from numba import njit
 
-def initialize_factions(N, num_factions, random):
-    faction_map = -1 * np.ones((N, N), dtype=int)
-    visited = np.zeros((N, N), dtype=bool)
-    frontier = []
+@njit('int64[:, :](int64, int64[:], boolean)', cache=True)
+def _flood_fill(N, centers, periodic):
+    # Works on flat cell indices so the queue is a single int32 array
+    labels = -np.ones(N * N, dtype=np.int64)
+    queue = np.empty(N * N, dtype=np.int32)
+    head = 0
+    tail = 0
 
+    for faction_id in range(centers.shape[0]):
+        labels[centers[faction_id]] = faction_id
+        queue[tail] = centers[faction_id]
+        tail += 1
+
+    # Breadth-first from all centers at once, same visiting order as the old list queue
+    neighbors = np.empty(4, dtype=np.int64)
+    while head < tail:
+        cell = queue[head]
+        head += 1
+        r = cell // N
+        c = cell - r * N
+        count = 0
+
+        if r > 0:
+            neighbors[count] = cell - N
+            count += 1
+        elif periodic:
+            neighbors[count] = cell + (N - 1) * N
+            count += 1
+        if r < N - 1:
+            neighbors[count] = cell + N
+            count += 1
+        elif periodic:
+            neighbors[count] = c
+            count += 1
+        if c > 0:
+            neighbors[count] = cell - 1
+            count += 1
+        elif periodic:
+            neighbors[count] = cell + N - 1
+            count += 1
+        if c < N - 1:
+            neighbors[count] = cell + 1
+            count += 1
+        elif periodic:
+            neighbors[count] = cell - c
+            count += 1
+
+        faction_id = labels[cell]
+        for k in range(count):
+            n = neighbors[k]
+            if labels[n] == -1:
+                labels[n] = faction_id
+                queue[tail] = n
+                tail += 1
+
+    return labels.reshape((N, N))
+
+def initialize_factions(N, num_factions, random, periodic=False):
     # Choose random centers for each faction
     centers = random.choice(N * N, size=num_factions, replace=False)
-    centers = np.column_stack(np.unravel_index(centers, (N, N)))
-
-    # Initialize each faction from its center
-    for faction_id, (r, c) in enumerate(centers):
-        faction_map[r, c] = faction_id
-        visited[r, c] = True
-        frontier.append((r, c, faction_id))
 
     # Flood fill to assign remaining cells to nearest faction
-    while frontier:
-        r, c, faction_id = frontier.pop(0)
-        for dr, dc in [(-1,0), (1,0), (0,-1), (0,1)]:
-            nr, nc = r + dr, c + dc
-            if not (0 <= nr < N and 0 <= nc < N):
-                continue
-            if not visited[nr, nc]:
-                faction_map[nr, nc] = faction_id
-                visited[nr, nc] = True
-                frontier.append((nr, nc, faction_id))
-
-    return faction_map
+    return _flood_fill(N, centers.astype(np.int64), bool(periodic))
+
+@njit('void(float64[:, ::1])', cache=True)
+def _wrap_halo(A):
+    # Copies the opposite edges into the one-cell border, for the periodic stencil
+    N = A.shape[0] - 2
+    for j in range(1, N + 1):
+        A[0, j] = A[N, j]
+        A[N + 1, j] = A[1, j]
+    for i in range(N + 2):
+        A[i, 0] = A[i, N]
+        A[i, N + 1] = A[i, 1]
+
+# Serial on purpose: Numba's parallel threading layer is not fork-safe, and the batch runner,
+# FSS driver and gunicorn all fork after the backend is imported
+@njit('void(float64[:, ::1], float64[:, ::1], float64[:, ::1], float64[:, ::1], float64, float64, float64, float64)', cache=True)
+def _gray_scott_step(U, V, U_next, V_next, Du, Dv, F, k):
+    # Same 3x3 Laplacian as testing/ising_factions.py, fused into one pass
+    N = U.shape[0] - 2
+    for i in range(1, N + 1):
+        for j in range(1, N + 1):
+            u = U[i, j]
+            v = V[i, j]
+            Lu = (0.2 * (U[i - 1, j] + U[i + 1, j] + U[i, j - 1] + U[i, j + 1])
+                  + 0.05 * (U[i - 1, j - 1] + U[i - 1, j + 1] + U[i + 1, j - 1] + U[i + 1, j + 1]) - u)
+            Lv = (0.2 * (V[i - 1, j] + V[i + 1, j] + V[i, j - 1] + V[i, j + 1])
+                  + 0.05 * (V[i - 1, j - 1] + V[i - 1, j + 1] + V[i + 1, j - 1] + V[i + 1, j + 1]) - v)
+            uvv = u * v * v
+            U_next[i, j] = min(max(u + Du * Lu - uvv + F * (1 - u), 0.0), 1.0)
+            V_next[i, j] = min(max(v + Dv * Lv + uvv - (F + k) * v, 0.0), 1.0)
+
+@njit('float64[:, :](float64[:, :], float64[:, :], int64, float64, float64, float64, float64)', cache=True)
+def _gray_scott(U, V, steps, Du, Dv, F, k):
+    N = U.shape[0]
+    # A periodic halo keeps the wraparound out of the inner loop, which then vectorizes
+    U_pad = np.empty((N + 2, N + 2))
+    V_pad = np.empty((N + 2, N + 2))
+    U_next = np.empty((N + 2, N + 2))
+    V_next = np.empty((N + 2, N + 2))
+    U_pad[1:-1, 1:-1] = U
+    V_pad[1:-1, 1:-1] = V
+
+    for _ in range(steps):
+        _wrap_halo(U_pad)
+        _wrap_halo(V_pad)
+        _gray_scott_step(U_pad, V_pad, U_next, V_next, Du, Dv, F, k)
+        U_pad, U_next = U_next, U_pad
+        V_pad, V_next = V_next, V_pad
+
+    return V_pad[1:-1, 1:-1].copy()
+
+def generate_pattern(N, random, steps=3000, Du=0.16, Dv=0.08, F=0.060, k=0.062, num_seeds=None):
+    U = np.ones((N, N))
+    V = np.zeros((N, N))
+
+    # Seed more spots on bigger grids so the pattern fills the lattice in the same number of steps
+    if num_seeds is None:
+        num_seeds = max(20, N * N // 100)
+    margin = max(1, N // 10)
+    for _ in range(num_seeds):
+        i, j = random.integers(margin, max(margin + 1, N - margin), size=2)
+        U[i-2:i+2, j-2:j+2] = 0.50
+        V[i-2:i+2, j-2:j+2] = 0.25
+
+    return _gray_scott(U, V, int(steps), float(Du), float(Dv), float(F), float(k))
+
+def reaction_diffusion_factions(N, num_factions, random, steps=3000):
+    # Cost is N² x steps: about 0.15 s at N=128, 0.6 s at 256 and 2 s at 512. Sub-second layouts
+    # need N <= 256 at the default 3000 steps; fewer steps are proportionally cheaper but leave
+    # the pattern less grown in.
+    V = generate_pattern(N, random, steps=steps)
+
+    # Equal-size bands of the concentration field become the factions
+    order = np.argsort(V.ravel(), kind='stable')
+    faction_map = np.empty(N * N, dtype=int)
+    faction_map[order] = np.arange(N * N) * num_factions // (N * N)
+    return faction_map.reshape((N, N))
 
 def generate_h_values(num_factions, external_field_range, random):
     h_vals = []
@@ -37,9 +149,45 @@ def generate_h_values(num_factions, external_field_range, random):
             h_vals.append(val)
     return h_vals
 
-def generate_h_map(faction_map, h_values):
+def build_faction_index(faction_map):
+    # CSR layout: cells of faction f are order[offsets[f]:offsets[f + 1]] (flat indices)
+    order = np.argsort(faction_map.ravel(), kind='stable')
+    counts = np.bincount(faction_map.ravel())
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    return order, offsets
+
+def faction_boundary_mask(faction_map):
+    # Cells with at least one periodic neighbour in another faction, matching the energy stencil
+    mask = np.zeros(faction_map.shape, dtype=bool)
+    for shift, axis in ((1, 0), (-1, 0), (1, 1), (-1, 1)):
+        mask |= faction_map != np.roll(faction_map, shift, axis=axis)
+    return mask
+
+def faction_borders(faction_map):
+    # Border segments as x, y coordinate arrays for a single Plotly line trace
+    N = faction_map.shape[0]
+    epsilon = 0.06
+    offset = 0.5
+
+    # Horizontal borders sit between a cell and its bottom neighbour
+    rows, cols = np.nonzero(faction_map[:-1, :] != faction_map[1:, :])
+    inner = ((cols > 0) & (cols < N - 1)) * epsilon
+    h_x = np.column_stack([cols - inner - offset, cols + 1 + inner - offset, np.full(len(cols), np.nan)])
+    h_y = np.column_stack([rows + 1 - offset, rows + 1 - offset, np.full(len(rows), np.nan)])
+
+    # Vertical borders sit between a cell and its right neighbour
+    rows, cols = np.nonzero(faction_map[:, :-1] != faction_map[:, 1:])
+    inner = ((rows > 0) & (rows < N - 1)) * epsilon
+    v_x = np.column_stack([cols + 1 - offset, cols + 1 - offset, np.full(len(cols), np.nan)])
+    v_y = np.column_stack([rows - inner - offset, rows + 1 + inner - offset, np.full(len(rows), np.nan)])
+
+    # NaN breaks the line between segments, like None did in plain lists
+    return np.concatenate([h_x.ravel(), v_x.ravel()]), np.concatenate([h_y.ravel(), v_y.ravel()])
+
+def generate_h_map(faction_map, h_values, index=None):
+    if index is None:
+        index = build_faction_index(faction_map)
+    order, offsets = index
     h_map = np.zeros_like(faction_map, dtype=float)
-    unique_factions = np.unique(faction_map)
-    for i, faction in enumerate(unique_factions):
-        h_map[faction_map == faction] = h_values[i]
-    return h_map 
\ No newline at end of file
+    h_map.flat[order] = np.repeat(h_values, np.diff(offsets))
+    return h_map
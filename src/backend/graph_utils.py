@@ -0,0 +1,164 @@
+import numpy as np
+from numba import njit
+
+def csr_from_edges(num_nodes, src, dst):
+    # Symmetric CSR adjacency with self-loops and duplicate edges dropped
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    keep = src != dst
+    src, dst = src[keep], dst[keep]
+    keys = np.concatenate((src * num_nodes + dst, dst * num_nodes + src))
+    # Sort and drop repeats by hand, np.unique is several times slower on tens of millions of keys
+    keys.sort()
+    if keys.shape[0]:
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    rows, indices = np.divmod(keys, num_nodes)
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_nodes), out=indptr[1:])
+    return indptr, indices
+
+def lattice_graph(N, periodic=True):
+    cells = np.arange(N * N).reshape(N, N)
+    right = np.roll(cells, -1, axis=1)
+    down = np.roll(cells, -1, axis=0)
+    if periodic:
+        src = np.concatenate((cells.ravel(), cells.ravel()))
+        dst = np.concatenate((right.ravel(), down.ravel()))
+    else:
+        src = np.concatenate((cells[:, :-1].ravel(), cells[:-1].ravel()))
+        dst = np.concatenate((right[:, :-1].ravel(), down[:-1].ravel()))
+    return csr_from_edges(N * N, src, dst)
+
+def small_world_graph(num_nodes, k, p, random):
+    # Watts-Strogatz: ring with k nearest neighbours, each edge's far end rewired with probability p
+    half = k // 2
+    src = np.repeat(np.arange(num_nodes), half)
+    dst = (src + np.tile(np.arange(1, half + 1), num_nodes)) % num_nodes
+    rewire = random.random(src.shape[0]) < p
+    dst[rewire] = random.integers(0, num_nodes, size=int(rewire.sum()))
+    return csr_from_edges(num_nodes, src, dst)
+
+@njit('int64[:, :](int64, int64, float64[:])', cache=True)
+def _barabasi_albert(num_nodes, m, rands):
+    edges = np.empty((2, (num_nodes - m) * m), dtype=np.int64)
+    # Every edge end is listed once, so a uniform pick from it is degree-proportional
+    ends = np.empty(2 * (num_nodes - m) * m, dtype=np.int64)
+    size = 0
+    e = 0
+    for node in range(m, num_nodes):
+        for j in range(m):
+            if size == 0:
+                target = j
+            else:
+                target = ends[int(rands[e] * size)]
+            edges[0, e] = node
+            edges[1, e] = target
+            e += 1
+        for j in range(e - m, e):
+            ends[size] = edges[1, j]
+            ends[size + 1] = node
+            size += 2
+    return edges
+
+def scale_free_graph(num_nodes, m, random):
+    # Barabasi-Albert preferential attachment; repeated picks of the same target collapse into one edge
+    edges = _barabasi_albert(int(num_nodes), int(m), random.random((num_nodes - m) * m))
+    return csr_from_edges(num_nodes, edges[0], edges[1])
+
+@njit('int64[:](int64[:], int64[:], int64[:])', cache=True)
+def _graph_flood_fill(indptr, indices, centers):
+    num_nodes = indptr.shape[0] - 1
+    labels = -np.ones(num_nodes, dtype=np.int64)
+    queue = np.empty(num_nodes, dtype=np.int64)
+    tail = 0
+    for faction_id in range(centers.shape[0]):
+        labels[centers[faction_id]] = faction_id
+        queue[tail] = centers[faction_id]
+        tail += 1
+
+    head = 0
+    while head < tail:
+        node = queue[head]
+        head += 1
+        for e in range(indptr[node], indptr[node + 1]):
+            n = indices[e]
+            if labels[n] == -1:
+                labels[n] = labels[node]
+                queue[tail] = n
+                tail += 1
+    return labels
+
+def graph_factions(indptr, indices, num_factions, random):
+    # Multi-source BFS from random centers, the graph analogue of initialize_factions
+    num_nodes = indptr.shape[0] - 1
+    centers = random.choice(num_nodes, size=num_factions, replace=False).astype(np.int64)
+    labels = _graph_flood_fill(indptr, indices, centers)
+    # Nodes in components without a center are spread over the factions at random
+    unreached = labels == -1
+    labels[unreached] = random.integers(0, num_factions, size=int(unreached.sum()))
+    return labels
+
+def edge_couplings(indptr, indices, faction_map, J_intra, J_inter):
+    src = np.repeat(np.arange(indptr.shape[0] - 1), np.diff(indptr))
+    return np.where(faction_map[src] == faction_map[indices], float(J_intra), float(J_inter))
+
+def graph_boundary_mask(indptr, indices, faction_map):
+    src = np.repeat(np.arange(indptr.shape[0] - 1), np.diff(indptr))
+    crossing = faction_map[src] != faction_map[indices]
+    return np.bincount(src[crossing], minlength=indptr.shape[0] - 1) > 0
+
+@njit('float64(int64[:], int64[:], int64[:], float64[:], float64[:])', cache=True)
+def graph_total_energy(spins, indptr, indices, couplings, h):
+    # Each undirected edge appears twice in the CSR arrays, hence the half
+    total = 0.0
+    for node in range(spins.shape[0]):
+        local = 0.0
+        for e in range(indptr[node], indptr[node + 1]):
+            local += couplings[e] * spins[indices[e]]
+        total -= spins[node] * (0.5 * local + h[node])
+    return total
+
+@njit(cache=True)
+def _local_field(node, spins, indptr, indices, couplings, h):
+    local = h[node]
+    for e in range(indptr[node], indptr[node + 1]):
+        local += couplings[e] * spins[indices[e]]
+    return local
+
+# Same counters as run_metropolis: counts is [attempted intra, attempted boundary,
+# accepted intra, accepted boundary], faction_accepts is accepted flips per faction.
+@njit('float64(int64[:], int64[:], int64[:], float64[:], float64[:], int64[:], boolean[:], float64, '
+      'int64[:], float64[:], float64, float64[:], int64[:], int64[:])', nogil=True, cache=True)
+def run_graph_metropolis(spins, indptr, indices, couplings, h, faction_map, boundary, T,
+                         nodes, rands, energy, energies_out, counts, faction_accepts):
+    for i in range(nodes.shape[0]):
+        node = nodes[i]
+        on_boundary = 1 if boundary[node] else 0
+        counts[on_boundary] += 1
+        delta = 2.0 * spins[node] * _local_field(node, spins, indptr, indices, couplings, h)
+        if delta <= 0 or rands[i] <= np.exp(-delta / T):
+            spins[node] *= -1
+            energy += delta
+            counts[2 + on_boundary] += 1
+            faction_accepts[faction_map[node]] += 1
+        energies_out[i] = energy
+    return energy
+
+@njit('float64(int64[:], int64[:], int64[:], float64[:], float64[:], int64[:], boolean[:], float64, '
+      'int64[:], float64[:], float64, float64[:], int64[:], int64[:])', nogil=True, cache=True)
+def run_graph_heat_bath(spins, indptr, indices, couplings, h, faction_map, boundary, T,
+                        nodes, rands, energy, energies_out, counts, faction_accepts):
+    # The spin is redrawn from its conditional distribution; an "accept" is a change of sign
+    for i in range(nodes.shape[0]):
+        node = nodes[i]
+        on_boundary = 1 if boundary[node] else 0
+        counts[on_boundary] += 1
+        local = _local_field(node, spins, indptr, indices, couplings, h)
+        new_spin = 1 if rands[i] * (1.0 + np.exp(-2.0 * local / T)) < 1.0 else -1
+        if new_spin != spins[node]:
+            energy += 2.0 * spins[node] * local
+            spins[node] = new_spin
+            counts[2 + on_boundary] += 1
+            faction_accepts[faction_map[node]] += 1
+        energies_out[i] = energy
+    return energy
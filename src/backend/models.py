@@ -1,7 +1,18 @@
+import asyncio
+import time
 import numpy as np
-from .faction_utils import initialize_factions, generate_h_values, generate_h_map
-from .energy_utils import get_energy_faction, get_total_energy
+from .faction_utils import initialize_factions, reaction_diffusion_factions, generate_h_values, generate_h_map, build_faction_index, faction_boundary_mask
+from .energy_utils import get_total_energy, run_metropolis
 from .state_utils import get_spin_percentages, get_magnetization, get_agreement_score
+from .accumulator_utils import ThermoAccumulator
+from .graph_utils import (graph_factions, edge_couplings, graph_boundary_mask, graph_total_energy,
+                          run_graph_metropolis, run_graph_heat_bath)
+
+OBSERVABLE_FIELDS = ('energy', 'magnetization', 'agreement', 'faction_spins')
+FRAME_FIELDS = OBSERVABLE_FIELDS + ('lattice',)
+
+# Largest number of trials handed to the kernel at once, bounds the per-chunk random draws
+MAX_CHUNK = 1 << 20
 
 class IsingSim:
     def __init__(self, 
@@ -11,58 +22,185 @@ class IsingSim:
                  J_inter=0.25, 
                  trials=1000,
                  external_field_range=(-400, 400),
-                 seed=None):
+                 seed=None,
+                 periodic_factions=False,
+                 faction_layout='flood',
+                 num_factions=None,
+                 keep_history=True):
 
         self.N = N
+        self._init_params(T, J_intra, J_inter, trials, external_field_range, seed, keep_history)
+
+        # Create lattice and factions
+        self.lattice = self.random.choice([-1, 1], size=(N, N))
+        self.num_factions = min(12, max(3, self.N // 5 + 2)) if num_factions is None else num_factions
+        if faction_layout == 'flood':
+            faction_map = initialize_factions(self.N, self.num_factions, self.random, periodic=periodic_factions)
+        elif faction_layout == 'reaction_diffusion':
+            faction_map = reaction_diffusion_factions(self.N, self.num_factions, self.random)
+        else:
+            raise ValueError(f"Unknown faction layout: {faction_layout}")
+        self._init_state(faction_map, faction_boundary_mask(faction_map))
+
+    def _init_params(self, T, J_intra, J_inter, trials, external_field_range, seed, keep_history):
         self.T = T
         self.J_intra = J_intra
         self.J_inter = J_inter
         self.trials = trials
+        # Without history only the latest energy is kept, for long runs measured through accumulators
+        self.keep_history = keep_history
         self.external_field_range = external_field_range
         self.random = np.random.default_rng(seed)
 
-        # Create lattice and factions
-        self.lattice = self.random.choice([-1, 1], size=(N, N))
-        self.num_factions = min(12, max(3, self.N // 5 + 2))
-        self.faction_map = initialize_factions(self.N, self.num_factions, self.random)
+    def _init_state(self, faction_map, boundary):
+        # Shared by both engines once the spins and factions are laid out
+        self.faction_map = faction_map
+        self.faction_index = build_faction_index(self.faction_map)
         self.h_values = generate_h_values(self.num_factions, self.external_field_range, self.random)
-        self.h_map = generate_h_map(self.faction_map, self.h_values)
+        self.h_map = generate_h_map(self.faction_map, self.h_values, self.faction_index)
+        self.boundary = boundary
 
         self.current_trial = 0
-        self.energies = [get_total_energy(self.lattice, self.faction_map, self.h_map, self.J_intra, self.J_inter)]
+        self.energies = [self.total_energy()]
 
         self.snapshots = []
+        self.reset_stats()
 
-    def _flip_probability(self, row, col):
-        delta = (get_energy_faction(row, col, -1, self.lattice, self.faction_map, self.h_map, self.J_intra, self.J_inter) -
-                 get_energy_faction(row, col,  1, self.lattice, self.faction_map, self.h_map, self.J_intra, self.J_inter))
-        if delta <= 0:
-            return 1.0
+    def _run_chunk(self, num_steps):
+        while num_steps > MAX_CHUNK:
+            self._run_chunk(MAX_CHUNK)
+            num_steps -= MAX_CHUNK
+        rows = self.random.integers(0, self.N, size=num_steps)
+        cols = self.random.integers(0, self.N, size=num_steps)
+        rands = self.random.random(num_steps)
+        energies = np.empty(num_steps)
+        start = time.perf_counter()
+        run_metropolis(self.lattice, self.faction_map, self.h_map, self.boundary,
+                       float(self.J_intra), float(self.J_inter), float(self.T),
+                       rows, cols, rands, float(self.energies[-1]), energies,
+                       self.flip_counts, self.faction_accepts)
+        self.step_seconds += time.perf_counter() - start
+        if self.keep_history:
+            self.energies.extend(energies.tolist())
         else:
-            return np.exp(-delta / self.T)
+            self.energies[-1] = float(energies[-1])
+        self.current_trial += num_steps
 
     def step(self, num_steps=1, record_snapshots=False):
-        for _ in range(num_steps):
-            row, col = self.random.integers(0, self.N, size=2)
-            prob = self._flip_probability(row, col)
-            if self.random.random() <= prob:
-                delta = (get_energy_faction(row, col, -1, self.lattice, self.faction_map, self.h_map, self.J_intra, self.J_inter) -
-                         get_energy_faction(row, col,  1, self.lattice, self.faction_map, self.h_map, self.J_intra, self.J_inter))
-                self.lattice[row, col] *= -1
-                self.energies.append(self.energies[-1] + delta)
-            else:
-                self.energies.append(self.energies[-1])
-
-            self.current_trial += 1
+        # Decay schedules and snapshots act between individual trials, so only
+        # the remaining trials can be handed to the kernel as a single chunk.
+        while num_steps > 0 and (record_snapshots or getattr(self, "_decay_schedule", None)):
+            self._run_chunk(1)
+            num_steps -= 1
 
             if record_snapshots and (self.current_trial % 10 == 0):
                 self.save_snapshot()
-            
+
             if hasattr(self, "_decay_schedule") and self._decay_schedule:
                 event = self._decay_schedule.pop(0)
                 if event[0] == "field":
                     self.h_map -= event[1]
-                    self.h_values = [np.mean(self.h_map[self.faction_map == f]) for f in range(self.num_factions)]
+                    # E has a -h * s term per spin, so lowering every h by c raises E by c * sum(s)
+                    self.energies[-1] += event[1] * self.lattice.sum()
+                    self.h_values = [np.mean(self.h_map.flat[self.faction_cells(f)]) for f in range(self.num_factions)]
+
+        if num_steps > 0:
+            self._run_chunk(num_steps)
+
+    def total_energy(self):
+        # Recomputed from scratch, for resyncing energies[-1] after changing couplings, fields or spins directly
+        return get_total_energy(self.lattice, self.faction_map, self.h_map, self.J_intra, self.J_inter)
+
+    def reset_stats(self):
+        self.flip_counts = np.zeros(4, dtype=np.int64)
+        self.faction_accepts = np.zeros(self.num_factions, dtype=np.int64)
+        self.step_seconds = 0.0
+
+    def stats(self):
+        attempted_intra, attempted_boundary, accepted_intra, accepted_boundary = (int(c) for c in self.flip_counts)
+        attempted = attempted_intra + attempted_boundary
+        accepted = accepted_intra + accepted_boundary
+        rate = lambda a, b: a / b if b else 0.0
+        return {
+            'attempted': attempted,
+            'accepted': accepted,
+            'attempted_intra': attempted_intra,
+            'attempted_boundary': attempted_boundary,
+            'accepted_intra': accepted_intra,
+            'accepted_boundary': accepted_boundary,
+            'faction_accepted': self.faction_accepts.tolist(),
+            'step_seconds': self.step_seconds,
+            'acceptance_rate': rate(accepted, attempted),
+            'intra_acceptance_rate': rate(accepted_intra, attempted_intra),
+            'boundary_acceptance_rate': rate(accepted_boundary, attempted_boundary),
+            'flips_per_second': rate(attempted, self.step_seconds),
+            'accepted_per_second': rate(accepted, self.step_seconds),
+            'boundary_fraction': float(self.boundary.mean()),
+        }
+
+    def iter_observables(self, every=1, fields=None, trials=None):
+        fields = self._check_fields(OBSERVABLE_FIELDS if fields is None else fields)
+        for chunk in self._chunks(every, trials):
+            yield self._step_and_observe(chunk, fields)
+
+    async def arun(self, chunk=100, fields=None, trials=None, executor=None):
+        # Chunks run in the executor (the kernel releases the GIL) and are awaited
+        # one at a time, so the simulation is never stepped concurrently.
+        fields = self._check_fields(FRAME_FIELDS if fields is None else fields)
+        loop = asyncio.get_running_loop()
+        for size in self._chunks(chunk, trials):
+            yield await loop.run_in_executor(executor, self._step_and_observe, size, fields)
+
+    def measure(self, accumulator=None, every=None, trials=None):
+        # Streams energy and magnetization per spin into a ThermoAccumulator, one sample per sweep by default
+        if accumulator is None:
+            accumulator = ThermoAccumulator(self.lattice.size, self.T)
+        every = self.lattice.size if every is None else every
+        for record in self.iter_observables(every=every, fields=('energy', 'magnetization'), trials=trials):
+            accumulator.update(record)
+        return accumulator
+
+    def observe(self, fields=None):
+        # Snapshot of the current state without stepping, same record shape as iter_observables
+        return self._observe(self._check_fields(OBSERVABLE_FIELDS if fields is None else fields))
+
+    def set_decay_schedule(self, schedule):
+        # Events from create_decay_schedule, one applied after each subsequent trial
+        self._decay_schedule = list(schedule)
+
+    def _check_fields(self, fields):
+        fields = tuple(fields)
+        unknown = set(fields) - set(FRAME_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown observable fields: {sorted(unknown)}")
+        return fields
+
+    def _chunks(self, every, trials):
+        if every <= 0:
+            raise ValueError(f"Chunk size must be positive, got {every}")
+        remaining = self.trials if trials is None else trials
+        while remaining > 0:
+            chunk = min(every, remaining)
+            remaining -= chunk
+            yield chunk
+
+    def _step_and_observe(self, num_steps, fields):
+        self.step(num_steps)
+        return self._observe(fields)
+
+    def _observe(self, fields):
+        record = {'trial': self.current_trial}
+        if 'lattice' in fields:
+            record['lattice'] = self.lattice.copy()
+        if 'energy' in fields:
+            record['energy'] = self.energies[-1] / self.lattice.size
+        if 'magnetization' in fields:
+            record['magnetization'] = float(self.get_magnetization())
+        if 'agreement' in fields:
+            record['agreement'] = float(self.get_agreement_score())
+        if 'faction_spins' in fields:
+            record['faction_spins'] = self.get_spin_percentages()
+        return record
 
     def adjust_constants(self, faction_id=None, new_J_intra=None, new_J_inter=None, new_T=None, new_h=None):
         if new_J_intra is not None:
@@ -73,22 +211,128 @@ class IsingSim:
             self.T = new_T
         if faction_id is not None and new_h is not None:
             self.h_values[faction_id] = new_h
-            self.h_map[self.faction_map == faction_id] = new_h
+            self.h_map.flat[self.faction_cells(faction_id)] = new_h
+
+    def faction_cells(self, faction_id):
+        order, offsets = self.faction_index
+        return order[offsets[faction_id]:offsets[faction_id + 1]]
+
+    def memory_usage(self):
+        # Python floats in the energy history cost a list slot plus a float object each
+        arrays = (self.lattice.nbytes + self.faction_map.nbytes + self.h_map.nbytes + self.boundary.nbytes +
+                  self.faction_index[0].nbytes)
+        return arrays + 32 * len(self.energies)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['lattice'] = self.lattice.astype(np.int8)
+        state['energies'] = np.array(self.energies)
+        return state
+
+    def __setstate__(self, state):
+        state['lattice'] = state['lattice'].astype(int)
+        state['energies'] = state['energies'].tolist()
+        self.__dict__.update(state)
 
     def get_current_state(self):
         return {
             'lattice': self.lattice.copy(),
             'faction_map': self.faction_map.copy(),
             'h_map': self.h_map.copy(),
-            'energies': np.array(self.energies) / (self.N * self.N),
+            'energies': np.array(self.energies) / self.lattice.size,
             'current_trial': self.current_trial,
         }
 
     def get_spin_percentages(self):
-        return get_spin_percentages(self.lattice, self.faction_map)
+        return get_spin_percentages(self.lattice, self.faction_map, self.faction_index)
 
     def get_magnetization(self):
         return get_magnetization(self.lattice)
 
     def get_agreement_score(self):
-        return get_agreement_score(self.lattice, self.N) 
\ No newline at end of file
+        return get_agreement_score(self.lattice, self.N) 
+
+GRAPH_KERNELS = {
+    'metropolis': run_graph_metropolis,
+    'heat_bath': run_graph_heat_bath,
+}
+
+class GraphIsingSim(IsingSim):
+    # Same API as IsingSim on an arbitrary CSR network: `lattice` holds one spin per node,
+    # faction_map/h_map are per node and couplings are per edge. Optional per-edge `weights`,
+    # aligned with the CSR indices and symmetric, scale J_intra/J_inter edge by edge.
+    def __init__(self,
+                 graph,
+                 T=2.5,
+                 J_intra=2.5,
+                 J_inter=0.25,
+                 trials=1000,
+                 external_field_range=(-400, 400),
+                 seed=None,
+                 num_factions=None,
+                 rule='metropolis',
+                 keep_history=True,
+                 weights=None):
+
+        if rule not in GRAPH_KERNELS:
+            raise ValueError(f"Unknown update rule: {rule}")
+        self.indptr, self.indices = graph
+        self.rule = rule
+        if weights is not None:
+            weights = np.ascontiguousarray(weights, dtype=float)
+            if weights.shape != self.indices.shape:
+                raise ValueError(f"Expected one weight per CSR entry ({self.indices.shape[0]}), got shape {weights.shape}")
+        self.weights = weights
+        self._init_params(T, J_intra, J_inter, trials, external_field_range, seed, keep_history)
+
+        # N is the node count here, not a side length; per-spin values divide by lattice.size
+        self.N = self.indptr.shape[0] - 1
+        self.lattice = self.random.choice([-1, 1], size=self.N)
+        self.num_factions = min(12, max(3, int(np.sqrt(self.N)) // 5 + 2)) if num_factions is None else num_factions
+        faction_map = graph_factions(self.indptr, self.indices, self.num_factions, self.random)
+        self._init_state(faction_map, graph_boundary_mask(self.indptr, self.indices, faction_map))
+
+    def couplings(self):
+        # Rebuilt only when J_intra/J_inter change (sliders, schedules)
+        key = (float(self.J_intra), float(self.J_inter))
+        if getattr(self, '_couplings_key', None) != key:
+            self._couplings = edge_couplings(self.indptr, self.indices, self.faction_map, *key)
+            if self.weights is not None:
+                self._couplings *= self.weights
+            self._couplings_key = key
+        return self._couplings
+
+    def total_energy(self):
+        return graph_total_energy(self.lattice, self.indptr, self.indices, self.couplings(), self.h_map)
+
+    def _run_chunk(self, num_steps):
+        while num_steps > MAX_CHUNK:
+            self._run_chunk(MAX_CHUNK)
+            num_steps -= MAX_CHUNK
+        nodes = self.random.integers(0, self.N, size=num_steps)
+        rands = self.random.random(num_steps)
+        energies = np.empty(num_steps)
+        start = time.perf_counter()
+        GRAPH_KERNELS[self.rule](self.lattice, self.indptr, self.indices, self.couplings(), self.h_map,
+                                 self.faction_map, self.boundary, float(self.T), nodes, rands,
+                                 float(self.energies[-1]), energies, self.flip_counts, self.faction_accepts)
+        self.step_seconds += time.perf_counter() - start
+        if self.keep_history:
+            self.energies.extend(energies.tolist())
+        else:
+            self.energies[-1] = float(energies[-1])
+        self.current_trial += num_steps
+
+    def memory_usage(self):
+        arrays = (self.lattice.nbytes + self.faction_map.nbytes + self.h_map.nbytes + self.boundary.nbytes +
+                  self.faction_index[0].nbytes + self.indptr.nbytes + 2 * self.indices.nbytes)
+        if self.weights is not None:
+            arrays += self.weights.nbytes
+        return arrays + 32 * len(self.energies)
+
+    def get_agreement_score(self):
+        # Fraction of edges whose ends agree, the network version of neighbour alignment
+        if self.indices.shape[0] == 0:
+            return 1.0
+        src = np.repeat(np.arange(self.N), np.diff(self.indptr))
+        return np.mean(self.lattice[src] == self.lattice[self.indices])
@@ -1,15 +1,19 @@
 import numpy as np
+from .faction_utils import build_faction_index
 
-def get_spin_percentages(lattice, faction_map):
-    faction_ids = np.unique(faction_map)
+def get_spin_percentages(lattice, faction_map, index=None):
+    if index is None:
+        index = build_faction_index(faction_map)
+    order, offsets = index
+    totals = np.diff(offsets)
+    # reduceat needs in-bounds starts, empty factions are masked out below
+    starts = np.minimum(offsets[:-1], max(len(order) - 1, 0))
+    net_spins = np.add.reduceat(lattice.ravel()[order], starts)
     spin_percentages = []
-    for f in faction_ids:
-        mask = faction_map == f
-        total = np.sum(mask)
+    for total, net_spin in zip(totals, net_spins):
         if total == 0:
             spin_percentages.append(0)
         else:
-            net_spin = np.sum(lattice[mask])
             percent = round(100 * net_spin / total, 2)
             spin_percentages.append(percent)
     return spin_percentages
@@ -18,14 +22,9 @@ def get_magnetization(lattice):
     return np.mean(lattice)
 
 def get_agreement_score(lattice, N):
-    aligned = 0
-    for r in range(N):
-        for c in range(N):
-            spin = lattice[r, c]
-            for dr, dc in [(-1,0),(1,0),(0,-1),(0,1)]:
-                nr, nc = (r+dr)%N, (c+dc)%N
-                aligned += (lattice[nr,nc] == spin)
-    return aligned / (N * N * 4)
+    # Every bond is seen from both ends, so down/right neighbours cover all four directions
+    aligned = np.sum(lattice == np.roll(lattice, 1, axis=0)) + np.sum(lattice == np.roll(lattice, 1, axis=1))
+    return 2 * aligned / (N * N * 4)
 
 class StateManager:
     def __init__(self):
@@ -41,4 +40,45 @@ class StateManager:
         self.snapshots.append(snapshot)
 
     def restore_snapshot(self, idx):
-        return self.snapshots[idx] 
\ No newline at end of file
+        return self.snapshots[idx]
+
+class FrameEncoder:
+    # Frames carry a sequence number. encode() is given the last one the client confirmed
+    # and falls back to a keyframe whenever that is not the frame it last handed out.
+    def __init__(self, keyframe_interval=50, max_delta_fraction=0.25):
+        self.keyframe_interval = keyframe_interval
+        # Past this share of changed cells a delta costs more than a keyframe
+        self.max_delta_fraction = max_delta_fraction
+        self.seq = 0
+        self._last = None
+        self._since_keyframe = 0
+
+    @property
+    def fresh(self):
+        return self._last is None
+
+    def reset(self):
+        self._last = None
+
+    def encode(self, lattice, base=None):
+        if (self._last is None or self._last.shape != lattice.shape
+                or self._since_keyframe >= self.keyframe_interval
+                or (base is not None and base != self.seq)):
+            return self._keyframe(lattice)
+
+        changed = np.flatnonzero(lattice != self._last)
+        if changed.shape[0] > self.max_delta_fraction * lattice.size:
+            return self._keyframe(lattice)
+        values = lattice.flat[changed]
+        # An empty delta is never sent, so it does not move the sequence
+        if changed.shape[0]:
+            self.seq += 1
+            self._last.flat[changed] = values
+        self._since_keyframe += 1
+        return {'type': 'delta', 'seq': self.seq, 'index': changed.tolist(), 'values': values.tolist()}
+
+    def _keyframe(self, lattice):
+        self.seq += 1
+        self._last = lattice.copy()
+        self._since_keyframe = 0
+        return {'type': 'key', 'seq': self.seq, 'lattice': lattice.tolist()}
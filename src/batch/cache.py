@@ -0,0 +1,134 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+import backend
+
+# Parameters that get their own indexed column, everything else is only in the config JSON
+COLUMNS = {
+    'N': 'INTEGER',
+    'T': 'REAL',
+    'J_intra': 'REAL',
+    'J_inter': 'REAL',
+    'seed': 'INTEGER',
+    'engine': 'TEXT',
+    'trials': 'INTEGER',
+    'num_factions': 'INTEGER',
+    'faction_layout': 'TEXT',
+}
+INDEXED = tuple(COLUMNS)
+
+# Labels that name a run without changing what it computes
+UNHASHED = ('name', 'run_id')
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    key TEXT PRIMARY KEY,
+    code_version TEXT NOT NULL,
+    {', '.join(f'{k} {t}' for k, t in COLUMNS.items())},
+    config TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    created REAL NOT NULL
+);
+""" + ''.join(f"CREATE INDEX IF NOT EXISTS runs_{k} ON runs ({k});\n" for k in INDEXED)
+
+
+# Batch modules that shape what a cached run contains (burn-in, cadence, thermo, summary layout)
+BATCH_MODULES = ('runner.py', 'cache.py')
+
+
+def result_modules():
+    backend_dir = os.path.dirname(backend.__file__)
+    batch_dir = os.path.dirname(os.path.abspath(__file__))
+    paths = [os.path.join(backend_dir, name) for name in sorted(os.listdir(backend_dir)) if name.endswith('.py')]
+    return paths + [os.path.join(batch_dir, name) for name in BATCH_MODULES]
+
+
+def code_version():
+    # Hash of every source that affects results, so changing any of them invalidates the cache
+    h = hashlib.blake2b(digest_size=8)
+    for path in result_modules():
+        with open(path, 'rb') as f:
+            h.update(os.path.basename(os.path.dirname(path)).encode() + b'/' + os.path.basename(path).encode())
+            h.update(f.read())
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, root):
+        self.root = root
+        self.version = code_version()
+        os.makedirs(os.path.join(root, 'blobs'), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, 'index.sqlite'))
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def key(self, spec):
+        config = {k: v for k, v in spec.items() if k not in UNHASHED}
+        payload = json.dumps({'config': config, 'code_version': self.version}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def blob_path(self, key):
+        return os.path.join(self.root, 'blobs', key[:2], f"{key}.npz")
+
+    def get(self, spec):
+        # Unseeded runs are never looked up, they are not meant to be reproducible
+        if spec.get('seed') is None:
+            return None
+        row = self.db.execute("SELECT summary FROM runs WHERE key = ?", (self.key(spec),)).fetchone()
+        if row is None or not os.path.exists(self.blob_path(self.key(spec))):
+            return None
+        return json.loads(row['summary'])
+
+    def put(self, spec, summary, arrays_path):
+        key = self.key(spec)
+        os.makedirs(os.path.dirname(self.blob_path(key)), exist_ok=True)
+        shutil.copyfile(arrays_path, self.blob_path(key))
+        config = {k: v for k, v in spec.items() if k not in UNHASHED}
+        with self.db:
+            self.db.execute(
+                f"INSERT OR REPLACE INTO runs (key, code_version, {', '.join(INDEXED)}, config, summary, created) "
+                f"VALUES ({', '.join('?' * (len(INDEXED) + 5))})",
+                (key, self.version, *(spec.get(k) for k in INDEXED),
+                 json.dumps(config), json.dumps(summary), time.time()))
+        return key
+
+    def load(self, key):
+        return dict(np.load(self.blob_path(key)))
+
+    def query(self, where='1', params=(), current_only=True):
+        # e.g. cache.query("J_inter < ? AND N = ?", (0.5, 64))
+        if current_only:
+            where = f"({where}) AND code_version = ?"
+            params = tuple(params) + (self.version,)
+        rows = self.db.execute(f"SELECT * FROM runs WHERE {where} ORDER BY N, T", params).fetchall()
+        return [{**dict(row), 'config': json.loads(row['config']), 'summary': json.loads(row['summary'])} for row in rows]
+
+    def close(self):
+        self.db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the batch result cache")
+    parser.add_argument('root', help="cache directory")
+    parser.add_argument('--where', default='1', help="SQL filter on the indexed columns, e.g. \"J_inter < 0.5\"")
+    parser.add_argument('--all-versions', action='store_true', help="include results from older code versions")
+    args = parser.parse_args(argv)
+
+    cache = ResultCache(args.root)
+    rows = cache.query(args.where, current_only=not args.all_versions)
+    for row in rows:
+        print(row['key'][:12], ' '.join(f"{k}={row[k]}" for k in INDEXED), f"final={row['summary']['final']}")
+    print(f"{len(rows)} run(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
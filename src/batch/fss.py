@@ -0,0 +1,162 @@
+import argparse
+import json
+import math
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from backend import IsingSim, EquilibrationDetector, ThermoAccumulator
+
+
+def set_field_scale(sim, scale):
+    for f in range(sim.num_factions):
+        sim.adjust_constants(faction_id=f, new_h=sim.h_values[f] * scale)
+    sim.energies[-1] = sim.total_energy()
+
+
+def run_point(N, T, params, samples, min_sweeps, max_sweeps):
+    started = time.perf_counter()
+    # The same seed per size keeps the faction layout fixed along each T curve
+    sim = IsingSim(N=N, T=T, seed=[params['seed'], N], keep_history=False,
+                   J_intra=params['J_intra'], J_inter=params['J_inter'],
+                   num_factions=params['num_factions'], faction_layout=params['faction_layout'],
+                   external_field_range=tuple(params['external_field_range']))
+    set_field_scale(sim, params['field_scale'])
+
+    sweep = N * N
+    detector = EquilibrationDetector()
+    for record in sim.iter_observables(every=sweep, fields=detector.fields, trials=max_sweeps * sweep):
+        if detector.update(record):
+            break
+    burn_in = detector.samples
+    tau = max(detector.taus().values())
+
+    # Aim for `samples` independent measurements, i.e. two autocorrelation times each
+    sweeps = int(min(max_sweeps, max(min_sweeps, math.ceil(2 * tau * samples))))
+    thermo = sim.measure(ThermoAccumulator(sweep, T), every=sweep, trials=sweeps * sweep)
+    results = thermo.results()
+
+    return {
+        'N': N,
+        'T': T,
+        'tau_sweeps': tau,
+        'burn_in_sweeps': burn_in,
+        'equilibrated': detector.equilibrated,
+        'sweeps': sweeps,
+        'seconds': time.perf_counter() - started,
+        'binder': results['binder'],
+        'susceptibility': results['abs_susceptibility'],
+        'specific_heat': results['specific_heat'],
+        'abs_magnetization': results['abs_magnetization'],
+    }
+
+
+def find_crossings(T, a, b):
+    # Linear interpolation of every sign change of a - b along the T grid
+    diff = np.asarray(a) - np.asarray(b)
+    crossings = []
+    for i in range(len(T) - 1):
+        if diff[i] == 0:
+            crossings.append(float(T[i]))
+        elif diff[i] * diff[i + 1] < 0:
+            crossings.append(float(T[i] + (T[i + 1] - T[i]) * diff[i] / (diff[i] - diff[i + 1])))
+    return crossings
+
+
+def analyse(points, sizes, temperatures):
+    curves = {}
+    for N in sizes:
+        by_T = {p['T']: p for p in points if p['N'] == N}
+        curves[N] = {
+            'T': list(temperatures),
+            'binder': [by_T[T]['binder']['mean'] for T in temperatures],
+            'binder_error': [by_T[T]['binder']['error'] for T in temperatures],
+            'susceptibility': [by_T[T]['susceptibility']['mean'] for T in temperatures],
+            'susceptibility_error': [by_T[T]['susceptibility']['error'] for T in temperatures],
+        }
+
+    crossings = {}
+    for small, large in zip(sizes, sizes[1:]):
+        crossings[f"{small}-{large}"] = find_crossings(temperatures, curves[small]['binder'], curves[large]['binder'])
+    estimates = [c for pair in crossings.values() for c in pair]
+
+    peaks = {N: temperatures[int(np.argmax(curves[N]['susceptibility']))] for N in sizes}
+    return {
+        'curves': curves,
+        'binder_crossings': crossings,
+        'susceptibility_peaks': peaks,
+        'Tc': float(np.mean(estimates)) if estimates else None,
+        'Tc_spread': float(np.std(estimates)) if len(estimates) > 1 else None,
+    }
+
+
+def run_fss(sizes, temperatures, params, samples=200, min_sweeps=100, max_sweeps=100_000, workers=None):
+    # Left to IsingSim the faction count grows with N, so the sizes would no longer share a model
+    if params['num_factions'] is None and (params['J_intra'] != params['J_inter'] or params['field_scale'] != 0):
+        raise ValueError("num_factions must be fixed when J_intra != J_inter or the fields are on")
+    sizes = sorted(sizes)
+    tasks = [(N, float(T)) for N in sizes for T in temperatures]
+    points = []
+    # Largest lattices first so they do not end up alone at the tail of the pool
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_point, N, T, params, samples, min_sweeps, max_sweeps)
+                   for N, T in sorted(tasks, key=lambda t: -t[0])]
+        for future in as_completed(futures):
+            point = future.result()
+            points.append(point)
+            print(f"[{len(points)}/{len(tasks)}] N={point['N']} T={point['T']:.4f} "
+                  f"tau={point['tau_sweeps']:.1f} sweeps={point['sweeps']} U={point['binder']['mean']:.4f}")
+
+    points.sort(key=lambda p: (p['N'], p['T']))
+    return {'params': params, 'points': points, **analyse(points, sizes, [float(T) for T in temperatures])}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Finite-size scaling: Binder and susceptibility curves across lattice sizes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[16, 32, 64])
+    parser.add_argument('--T', type=float, nargs=3, metavar=('START', 'STOP', 'NUM'), default=[2.0, 2.6, 13],
+                        help="temperature grid, as for numpy.linspace")
+    parser.add_argument('--J-intra', type=float, default=1.0)
+    parser.add_argument('--J-inter', type=float, default=1.0)
+    parser.add_argument('--num-factions', type=int, default=6,
+                        help="fixed across sizes, IsingSim's own default grows with N")
+    parser.add_argument('--faction-layout', default='flood', choices=['flood', 'reaction_diffusion'])
+    parser.add_argument('--field-range', type=float, nargs=2, default=[-400, 400])
+    parser.add_argument('--field-scale', type=float, default=0.0,
+                        help="multiplies the drawn faction fields, 0 gives the zero-field model (default)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--samples', type=int, default=200, help="independent samples to aim for per point")
+    parser.add_argument('--min-sweeps', type=int, default=100)
+    parser.add_argument('--max-sweeps', type=int, default=100_000)
+    parser.add_argument('--workers', '-j', type=int, default=None)
+    parser.add_argument('--output', '-o', default='fss.json')
+    args = parser.parse_args(argv)
+
+    params = {
+        'J_intra': args.J_intra,
+        'J_inter': args.J_inter,
+        'num_factions': args.num_factions,
+        'faction_layout': args.faction_layout,
+        'external_field_range': args.field_range,
+        'field_scale': args.field_scale,
+        'seed': args.seed,
+    }
+    temperatures = np.linspace(args.T[0], args.T[1], int(args.T[2]))
+
+    started = time.perf_counter()
+    result = run_fss(args.sizes, temperatures, params, args.samples, args.min_sweeps, args.max_sweeps, args.workers)
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    for pair, crossings in result['binder_crossings'].items():
+        print(f"Binder crossing {pair}: {', '.join(f'{c:.4f}' for c in crossings) or 'none'}")
+    if result['Tc'] is not None:
+        print(f"Tc ~ {result['Tc']:.4f}" + (f" ± {result['Tc_spread']:.4f}" if result['Tc_spread'] is not None else ''))
+    print(f"Wrote {args.output} in {time.perf_counter() - started:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
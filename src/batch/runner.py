@@ -0,0 +1,313 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+# Only the backend is imported here, so batch workers never pay for Dash or Plotly
+from backend import (IsingSim, GraphIsingSim, EquilibrationDetector, ThermoAccumulator, inject_event,
+                     create_decay_schedule, lattice_graph, small_world_graph, scale_free_graph, minmax_envelope)
+from backend.models import FRAME_FIELDS, OBSERVABLE_FIELDS
+from batch.cache import ResultCache
+
+GRAPH_KEYS = ('T', 'J_intra', 'J_inter', 'external_field_range', 'seed', 'num_factions')
+
+ENGINES = {
+    'metropolis': lambda params, graph: IsingSim(**params),
+    'graph_metropolis': lambda params, graph: GraphIsingSim(graph, rule='metropolis', **{k: params[k] for k in GRAPH_KEYS}),
+    'graph_heat_bath': lambda params, graph: GraphIsingSim(graph, rule='heat_bath', **{k: params[k] for k in GRAPH_KEYS}),
+}
+
+# 'graph' settings for the graph engines; the lattice graph uses N, the others their own node count
+GRAPH_SETTINGS = {
+    'lattice': {'required': (), 'optional': ('periodic',)},
+    'small_world': {'required': ('nodes',), 'optional': ('k', 'p')},
+    'scale_free': {'required': ('nodes',), 'optional': ('m',)},
+}
+
+GRAPHS = {
+    'lattice': lambda N, random, periodic=True: lattice_graph(N, periodic),
+    'small_world': lambda N, random, nodes, k=6, p=0.1: small_world_graph(nodes, k, p, random),
+    'scale_free': lambda N, random, nodes, m=3: scale_free_graph(nodes, m, random),
+}
+
+MODEL_KEYS = ('N', 'T', 'J_intra', 'J_inter', 'external_field_range', 'seed',
+              'num_factions', 'faction_layout', 'periodic_factions')
+
+DEFAULTS = {
+    'N': 25,
+    'T': 2.5,
+    'J_intra': 2.5,
+    'J_inter': 0.25,
+    'external_field_range': [-400, 400],
+    'seed': None,
+    'num_factions': None,
+    'faction_layout': 'flood',
+    'periodic_factions': False,
+    'engine': 'metropolis',
+    'graph': {'type': 'lattice'},
+    'trials': 100_000,
+    # Burn-in trials before recording, or 'auto' to run until energy and magnetization equilibrate
+    'burn_in': 0,
+    'max_burn_in': None,
+    # Recording cadence in trials, or 'auto' for twice the autocorrelation time measured during burn-in
+    'record_every': 1000,
+    'fields': list(OBSERVABLE_FIELDS),
+    'schedule': [],
+}
+
+SCHEDULE_ACTIONS = ('T', 'J_intra', 'J_inter', 'inject', 'decay')
+
+# Scalar series also get a min/max envelope of at most this many points, for plotting long runs
+ENVELOPE_FIELDS = ('energy', 'magnetization', 'agreement')
+ENVELOPE_POINTS = 2000
+
+
+def load_config(path):
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit("YAML configs need PyYAML (pip install pyyaml), or use a .json config")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def expand_runs(config):
+    # A config is either a single run, or {'defaults': {...}, 'runs': [...]}. Any run
+    # may carry a 'sweep' mapping whose lists are expanded as a cartesian product.
+    defaults = config.get('defaults', {})
+    runs = config.get('runs')
+    if runs is None:
+        runs = [{k: v for k, v in config.items() if k not in ('defaults', 'output')}]
+
+    specs = []
+    for i, run in enumerate(runs):
+        run = {**defaults, **run}
+        name = run.pop('name', f'run{i}')
+        sweep = run.pop('sweep', None) or {}
+        keys = list(sweep)
+        for j, values in enumerate(itertools.product(*(sweep[k] for k in keys))):
+            spec = {**DEFAULTS, **run, **dict(zip(keys, values))}
+            spec['name'] = name
+            spec['run_id'] = f"{name}-{j:04d}" if keys else name
+            check_spec(spec)
+            specs.append(spec)
+    return specs
+
+
+def check_spec(spec):
+    unknown = set(spec) - set(DEFAULTS) - {'name', 'run_id'}
+    if unknown:
+        raise ValueError(f"{spec['run_id']}: unknown run keys {sorted(unknown)}")
+    if spec['engine'] not in ENGINES:
+        raise ValueError(f"{spec['run_id']}: unknown engine {spec['engine']!r}, expected one of {sorted(ENGINES)}")
+    check_graph(spec)
+    unknown = set(spec['fields']) - set(FRAME_FIELDS)
+    if unknown:
+        raise ValueError(f"{spec['run_id']}: unknown observable fields {sorted(unknown)}")
+    if spec['burn_in'] != 'auto' and not (isinstance(spec['burn_in'], int) and spec['burn_in'] >= 0):
+        raise ValueError(f"{spec['run_id']}: burn_in must be a trial count or 'auto'")
+    if spec['record_every'] != 'auto' and not (isinstance(spec['record_every'], int) and spec['record_every'] > 0):
+        raise ValueError(f"{spec['run_id']}: record_every must be a positive trial count or 'auto'")
+    for event in spec['schedule']:
+        if 'at' not in event or not any(k in event for k in SCHEDULE_ACTIONS):
+            raise ValueError(f"{spec['run_id']}: schedule entries need 'at' and one of {SCHEDULE_ACTIONS}")
+
+
+def check_graph(spec):
+    graph_type = spec['graph'].get('type')
+    if graph_type not in GRAPHS:
+        raise ValueError(f"{spec['run_id']}: unknown graph type {graph_type!r}, expected one of {sorted(GRAPHS)}")
+    settings = set(spec['graph']) - {'type'}
+    missing = set(GRAPH_SETTINGS[graph_type]['required']) - settings
+    if missing:
+        raise ValueError(f"{spec['run_id']}: {graph_type} graphs need {sorted(missing)}")
+    unknown = settings - set(GRAPH_SETTINGS[graph_type]['required']) - set(GRAPH_SETTINGS[graph_type]['optional'])
+    if unknown:
+        raise ValueError(f"{spec['run_id']}: unknown {graph_type} graph settings {sorted(unknown)}")
+
+
+def apply_event(sim, event):
+    for key in ('T', 'J_intra', 'J_inter'):
+        if key in event:
+            setattr(sim, key, event[key])
+    if 'inject' in event:
+        inject_event(sim.lattice, event['inject'], sim.random)
+    if 'decay' in event:
+        sim.set_decay_schedule(create_decay_schedule(*event['decay']))
+    # The kernels only track energy changes of their own flips, so direct edits need a resync
+    sim.energies[-1] = sim.total_energy()
+
+
+def segments(trials, schedule):
+    # Splits [0, trials) at the schedule points, yielding (length, events due at its start)
+    points = sorted({0} | {e['at'] for e in schedule if 0 < e['at'] < trials}) + [trials]
+    for start, end in zip(points, points[1:]):
+        due = [e for e in schedule if (e['at'] <= 0 if start == 0 else e['at'] == start)]
+        yield end - start, due
+
+
+def burn_in(sim, spec):
+    if spec['burn_in'] != 'auto':
+        sim.step(spec['burn_in'])
+        return {'trials': spec['burn_in']}, None
+
+    # Observed once per sweep unless a fixed cadence was asked for
+    every = sim.lattice.size if spec['record_every'] == 'auto' else spec['record_every']
+    limit = spec['max_burn_in'] or 10 * spec['trials']
+    detector = EquilibrationDetector()
+    for record in sim.iter_observables(every=every, fields=detector.fields, trials=limit):
+        if detector.update(record):
+            break
+    tau = {field: t * every for field, t in detector.taus().items()}
+    info = {'trials': sim.current_trial, 'equilibrated': detector.equilibrated, 'tau': tau}
+    return info, max(tau.values())
+
+
+def build_sim(spec):
+    params = {k: spec[k] for k in MODEL_KEYS}
+    params['external_field_range'] = tuple(params['external_field_range'])
+    graph = None
+    if spec['engine'].startswith('graph_'):
+        settings = {k: v for k, v in spec['graph'].items() if k != 'type'}
+        graph = GRAPHS[spec['graph']['type']](spec['N'], np.random.default_rng([spec['seed'], 1]), **settings)
+    sim = ENGINES[spec['engine']](params, graph)
+    # Observables are recorded at the run's cadence, the per-trial energy history is never needed
+    sim.keep_history = False
+    return sim
+
+
+def run_one(spec, output_dir):
+    spec = dict(spec)
+    # Unseeded runs still get a recorded seed so every result can be reproduced
+    if spec['seed'] is None:
+        spec['seed'] = int(np.random.SeedSequence().entropy % 2**63)
+
+    started = time.perf_counter()
+    sim = build_sim(spec)
+    burn_in_info, tau = burn_in(sim, spec)
+    if spec['record_every'] == 'auto':
+        record_every = max(1, math.ceil(2 * tau)) if tau is not None else sim.lattice.size
+    else:
+        record_every = spec['record_every']
+
+    # Schedule points are counted from the end of burn-in
+    records = [sim.observe(spec['fields'])]
+    for length, events in segments(spec['trials'], spec['schedule']):
+        for event in events:
+            apply_event(sim, event)
+        records += sim.iter_observables(every=record_every, fields=spec['fields'], trials=length)
+
+    thermo = None
+    if 'energy' in spec['fields'] and 'magnetization' in spec['fields']:
+        thermo = ThermoAccumulator(sim.lattice.size, sim.T)
+        for record in records[1:]:
+            thermo.update(record)
+
+    arrays = {'trial': np.array([r['trial'] for r in records])}
+    for field in spec['fields']:
+        arrays[field] = np.array([r[field] for r in records])
+    for field in ENVELOPE_FIELDS:
+        if field in spec['fields']:
+            arrays['envelope_trial'], arrays[f'{field}_min'], arrays[f'{field}_max'] = minmax_envelope(
+                arrays['trial'], arrays[field], ENVELOPE_POINTS)
+    arrays['final_lattice'] = sim.lattice.astype(np.int8)
+    arrays['faction_map'] = sim.faction_map
+    arrays['h_map'] = sim.h_map
+    np.savez_compressed(os.path.join(output_dir, f"{spec['run_id']}.npz"), **arrays)
+
+    summary = {
+        'run_id': spec['run_id'],
+        'config': spec,
+        'seconds': time.perf_counter() - started,
+        'stats': sim.stats(),
+        'burn_in': burn_in_info,
+        'record_every': record_every,
+        'thermo': thermo.results() if thermo is not None else None,
+        'final': sim.observe(('energy', 'magnetization', 'agreement')),
+    }
+    with open(os.path.join(output_dir, f"{spec['run_id']}.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def restore_cached(spec, summary, cache, output_dir):
+    summary = {**summary, 'run_id': spec['run_id'], 'config': {**summary['config'], 'name': spec['name'], 'run_id': spec['run_id']}}
+    shutil.copyfile(cache.blob_path(cache.key(spec)), os.path.join(output_dir, f"{spec['run_id']}.npz"))
+    with open(os.path.join(output_dir, f"{spec['run_id']}.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def run_batch(specs, output_dir, workers=None, cache=None):
+    os.makedirs(output_dir, exist_ok=True)
+    summaries = []
+    pending = []
+    for spec in specs:
+        cached = cache.get(spec) if cache is not None else None
+        if cached is None:
+            pending.append(spec)
+        else:
+            summaries.append(restore_cached(spec, cached, cache, output_dir))
+    if cache is not None:
+        print(f"{len(summaries)} of {len(specs)} run(s) found in the cache")
+
+    def finished(spec, summary):
+        summaries.append(summary)
+        # The cache is written from this process only, so SQLite never sees concurrent writers
+        if cache is not None and spec['seed'] is not None:
+            cache.put(spec, summary, os.path.join(output_dir, f"{spec['run_id']}.npz"))
+        print(f"[{len(summaries)}/{len(specs)}] {spec['run_id']} done in {summary['seconds']:.2f} s")
+
+    if workers == 1:
+        for spec in pending:
+            finished(spec, run_one(spec, output_dir))
+    elif pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_one, spec, output_dir): spec for spec in pending}
+            for future in as_completed(futures):
+                finished(futures[future], future.result())
+
+    summaries.sort(key=lambda s: s['run_id'])
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump({'runs': [{'run_id': s['run_id'], 'config': s['config'], 'seconds': s['seconds'], 'final': s['final']}
+                            for s in summaries]}, f, indent=2)
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Ising simulations headlessly from a YAML or JSON config")
+    parser.add_argument('config', help="YAML or JSON run description")
+    parser.add_argument('--output', '-o', help="output directory (default: 'output' from the config, else ./results)")
+    parser.add_argument('--workers', '-j', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--cache', help="result cache directory, seeded runs already in it are not recomputed")
+    parser.add_argument('--dry-run', action='store_true', help="print the expanded runs without executing them")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    specs = expand_runs(config)
+    output_dir = args.output or config.get('output', 'results')
+
+    if args.dry_run:
+        for spec in specs:
+            print(spec['run_id'], {k: spec[k] for k in MODEL_KEYS + ('engine', 'trials')})
+        return 0
+
+    started = time.perf_counter()
+    print(f"Running {len(specs)} run(s) into {output_dir}")
+    cache = ResultCache(args.cache) if args.cache else None
+    run_batch(specs, output_dir, workers=args.workers, cache=cache)
+    print(f"Finished in {time.perf_counter() - started:.2f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
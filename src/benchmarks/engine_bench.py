@@ -0,0 +1,173 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numba
+import numpy as np
+
+from backend import (IsingSim, GraphIsingSim, initialize_factions, reaction_diffusion_factions, faction_borders,
+                     get_total_energy, small_world_graph, warmup)
+
+SIZES = (20, 128, 512, 2048)
+QUICK_SIZES = (20, 128)
+TEMPERATURES = (1.0, 2.5, 5.0)
+FACTION_COUNTS = (3, 6, 12)
+STEPS = 200_000
+REPEATS = 3
+
+# Reaction-diffusion cost grows with N² times the step count, about 2 s at 512, so 2048 is skipped
+REACTION_DIFFUSION_MAX_N = 512
+
+# Graph engines run on a small-world network with as many nodes as the N x N lattice
+ENGINES = {
+    'metropolis': lambda N, T, factions: IsingSim(N=N, T=T, num_factions=factions, seed=0),
+    'graph_metropolis': lambda N, T, factions: GraphIsingSim(
+        small_world_graph(N * N, 4, 0.1, np.random.default_rng(0)), T=T, num_factions=factions, seed=0),
+    'graph_heat_bath': lambda N, T, factions: GraphIsingSim(
+        small_world_graph(N * N, 4, 0.1, np.random.default_rng(0)), T=T, num_factions=factions, seed=0, rule='heat_bath'),
+}
+
+
+def best_time(fn, repeats=REPEATS, number=1):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def bench_engines(sizes):
+    results = []
+    for engine, build in ENGINES.items():
+        for N in sizes:
+            for T in TEMPERATURES:
+                for factions in FACTION_COUNTS:
+                    sim = build(N, T, factions)
+                    sim.step(1000)
+                    sim.reset_stats()
+                    seconds = best_time(lambda: sim.step(STEPS))
+                    results.append({
+                        'name': 'step', 'engine': engine, 'N': N, 'T': T, 'factions': factions,
+                        'seconds': seconds, 'rate': STEPS / seconds, 'unit': 'flips/s',
+                        'acceptance_rate': sim.stats()['acceptance_rate'],
+                    })
+    return results
+
+
+def bench_observables(sizes):
+    results = []
+    for N in sizes:
+        sim = IsingSim(N=N, num_factions=6, seed=0)
+        sim.step(10_000)
+        cases = {
+            'get_total_energy': lambda: get_total_energy(sim.lattice, sim.faction_map, sim.h_map, sim.J_intra, sim.J_inter),
+            'magnetization': sim.get_magnetization,
+            'agreement': sim.get_agreement_score,
+            'spin_percentages': sim.get_spin_percentages,
+        }
+        for name, fn in cases.items():
+            # These are sub-millisecond at small N, average over a batch of calls to beat timer noise
+            seconds = best_time(fn, number=max(1, 20_000 // N))
+            results.append({'name': name, 'N': N, 'factions': 6, 'seconds': seconds, 'rate': 1 / seconds, 'unit': 'calls/s'})
+    return results
+
+
+def bench_factions(sizes):
+    results = []
+    for N in sizes:
+        for factions in FACTION_COUNTS:
+            seconds = best_time(lambda: initialize_factions(N, factions, np.random.default_rng(0)))
+            results.append({'name': 'initialize_factions', 'N': N, 'factions': factions,
+                            'seconds': seconds, 'rate': N * N / seconds, 'unit': 'cells/s'})
+
+            faction_map = initialize_factions(N, factions, np.random.default_rng(0))
+            seconds = best_time(lambda: faction_borders(faction_map))
+            results.append({'name': 'faction_borders', 'N': N, 'factions': factions,
+                            'seconds': seconds, 'rate': N * N / seconds, 'unit': 'cells/s'})
+
+            if N <= REACTION_DIFFUSION_MAX_N:
+                seconds = best_time(lambda: reaction_diffusion_factions(N, factions, np.random.default_rng(0)), repeats=1)
+                results.append({'name': 'reaction_diffusion_factions', 'N': N, 'factions': factions,
+                                'seconds': seconds, 'rate': N * N / seconds, 'unit': 'cells/s'})
+    return results
+
+
+def result_key(result):
+    return tuple((k, result[k]) for k in ('name', 'engine', 'N', 'T', 'factions') if k in result)
+
+
+def compare(results, baseline, threshold):
+    previous = {result_key(r): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        ratio = result['rate'] / old['rate']
+        result['baseline_rate'] = old['rate']
+        result['ratio'] = ratio
+        label = ' '.join(f"{k}={v}" for k, v in result_key(result))
+        flag = ''
+        if ratio < 1 - threshold:
+            regressions.append(result)
+            flag = '  <-- REGRESSION'
+        print(f"{label:<60} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput benchmarks for the Ising backend")
+    parser.add_argument('--output', '-o', default='bench_results.json', help="where to write the JSON results")
+    parser.add_argument('--compare', help="baseline JSON from an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="relative slowdown that counts as a regression (default 0.15)")
+    parser.add_argument('--quick', action='store_true', help=f"only run N in {QUICK_SIZES}")
+    parser.add_argument('--only', choices=['engines', 'observables', 'factions'], action='append',
+                        help="run a subset of the suites (repeatable)")
+    args = parser.parse_args(argv)
+
+    sizes = QUICK_SIZES if args.quick else SIZES
+    suites = {'engines': bench_engines, 'observables': bench_observables, 'factions': bench_factions}
+    selected = args.only or list(suites)
+
+    warmup(verbose=False)
+    results = []
+    for name in selected:
+        print(f"Running {name} benchmarks for N in {sizes}")
+        results += suites[name](sizes)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'numba': numba.__version__,
+            'machine': platform.machine(),
+            'steps': STEPS,
+            'repeats': REPEATS,
+        },
+        'results': results,
+    }
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        report['meta']['baseline'] = args.compare
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,15 @@
+import time
+startup = time.perf_counter()
+
 import dash
-from backend import IsingSim
+from backend import IsingSim, FrameEncoder, faction_borders, warmup
 from frontend.layout import create_app_layout
 from frontend.callbacks import register_callbacks
-from frontend.helpers import compute_faction_borders, compute_faction_labels
+from frontend.helpers import compute_faction_labels
+from frontend.sessions import SessionPool
+from frontend.metrics import Metrics
+from frontend.constants import (session_memory_cap, session_spill_dir, session_spill_max_age, session_prewarm, keyframe_interval,
+                                metrics_enabled)
 
 app = dash.Dash(
     __name__,
@@ -13,47 +20,45 @@ app = dash.Dash(
 )
 server = app.server
 
-models_container = {}
-register_callbacks(app, models_container)
+# Compile (or load cached) kernels while the worker boots, not on the first page load
+warmup()
 
-def generate_fresh_layout():
+def create_session():
     models = {
         'Ferromagnet': IsingSim(N=20),
         'Election':     IsingSim(N=20),
         'Stock Market': IsingSim(N=20)
     }
 
-    initial_store = {}
+    views = {}
     for name, model in models.items():
-        state = model.get_current_state()
-        borders_x, borders_y = compute_faction_borders(state['faction_map'])
-        labels = compute_faction_labels(state['faction_map'])
-
-        initial_store[name] = {
-            "state": state,
-            "constants": {
-                "J_intra": model.J_intra,
-                "J_inter": model.J_inter,
-                "T": model.T,
-            },
+        borders_x, borders_y = faction_borders(model.faction_map)
+        views[name] = {
             "active": name == "Ferromagnet",
-            "lattice": state['lattice'].tolist(),
-            "faction_map": state['faction_map'].tolist(),
-            "h_map": state['h_map'].tolist(),
-            "energies": state['energies'].tolist(),
-            "current_trial": state['current_trial'],
-            "snapshots": [],
             "borders_x": borders_x,
             "borders_y": borders_y,
-            "labels": labels,
+            "labels": compute_faction_labels(model.faction_map),
+            "frames": FrameEncoder(keyframe_interval),
+            "energy_cursor": None,
+            "energy_rebuilt_at": 0,
+            "injections": 0,
         }
 
-    models_container.clear()
-    models_container.update(models)
+    return {"models": models, "views": views}
 
-    return create_app_layout(initial_store)
+session_pool = SessionPool(create_session, max_bytes=session_memory_cap, spill_dir=session_spill_dir, prewarm=session_prewarm,
+                           spill_max_age=session_spill_max_age)
+metrics = Metrics(enabled=metrics_enabled)
+if metrics_enabled:
+    metrics.register(server)
+register_callbacks(app, session_pool, metrics)
+
+def generate_fresh_layout():
+    session_id, session = session_pool.create()
+    return create_app_layout(session_id, session['models'])
 
 app.layout = generate_fresh_layout
+print(f"App ready in {time.perf_counter() - startup:.2f} s")
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8050, debug=True)
@@ -1,15 +1,75 @@
 import dash
 import numpy as np
 from dash import Input, Output, State, callback_context, ALL
+from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
 import plotly.express as px
 
-from backend import inject_event
-from .constants import color_maps, character_maps, glow_layers, blue, white, black, agreement_titles, event_mapping, scale_val
-from .helpers import button_style, inject_button_style
+from backend import inject_event, lttb
+from .constants import color_maps, character_maps, glow_layers, blue, white, agreement_titles, event_mapping, scale_val, lattice_render_mode, energy_window, glyph_max_size
+from .helpers import button_style, inject_button_style, model_constants, model_state, create_lattice_figure, create_initial_lattice_figure, create_energy_figure, lattice_delta_patch, lattice_glyphs
 from .layout import generate_model_layout
 
-def register_callbacks(app, models):
+# Applies a FrameEncoder frame to the lattice figure already in the browser, so in
+# clientside mode the server only builds the figure when its skeleton changes.
+APPLY_LATTICE_FRAME = """
+function(frame, figure) {
+    // Frames without a type only record the sequence of a figure the server sent whole
+    if (!frame || !frame.type || !figure || !figure.data) {
+        return window.dash_clientside.no_update;
+    }
+    const fig = Object.assign({}, figure, {data: figure.data.slice()});
+    const heat = Object.assign({}, fig.data[0]);
+
+    if (frame.type === 'key') {
+        heat.z = frame.lattice;
+        if (frame.glyphs) {
+            heat.text = frame.lattice.map(row => row.map(v => frame.glyphs[v]));
+        }
+    } else {
+        heat.z = heat.z.map(row => row.slice());
+        if (frame.glyphs) {
+            heat.text = heat.text.map(row => row.slice());
+        }
+        frame.index.forEach((idx, i) => {
+            const r = Math.floor(idx / frame.size);
+            const c = idx % frame.size;
+            heat.z[r][c] = frame.values[i];
+            if (frame.glyphs) {
+                heat.text[r][c] = frame.glyphs[frame.values[i]];
+            }
+        });
+    }
+
+    fig.data[0] = heat;
+    return fig;
+}
+"""
+
+# Fans one batch of new energy points out to the glow layers and the main line
+EXTEND_ENERGY = """
+function(frame) {
+    // A frame without points only records the end of a chart the server sent whole
+    if (!frame || !frame.x) {
+        return window.dash_clientside.no_update;
+    }
+    const indices = [...Array(frame.traces).keys()];
+    return [
+        {x: indices.map(() => frame.x), y: indices.map(() => frame.y)},
+        indices,
+        frame.window
+    ];
+}
+"""
+
+def register_callbacks(app, session_pool, metrics):
+    def get_session(store_data):
+        # Unknown or expired ids are replaced by update_model_store, the other callbacks wait for it
+        session = session_pool.get(store_data['session_id'])
+        if session is None:
+            raise PreventUpdate
+        return session
+
     @app.callback(
         Output('model-store', 'data'),
         [
@@ -43,37 +103,33 @@ def register_callbacks(app, models):
         triggered_props = callback_context.triggered
         triggered_ids = [t['prop_id'].split('.')[0] for t in triggered_props]
 
-        if not store_data or tab not in store_data:
-            print(f"No store_data or tab '{tab}' not found.")
+        if not store_data:
+            print("No store_data found.")
             return dash.no_update
 
-        sim = models[tab]
+        timer = metrics.start('update_model_store')
+        session_id = store_data['session_id']
+        session = session_pool.get(session_id)
+        if session is None:
+            print(f"Session {session_id} expired, starting a fresh one")
+            session_id, session = session_pool.create()
+        views = session['views']
+        sim = session['models'][tab]
+        changed = {'session_id': session_id, 'version': store_data['version'] + 1}
 
         if 'model-tabs' in triggered_ids:
-            for m in store_data:
-                store_data[m]['active'] = False
-            store_data[tab]['active'] = True
+            for m in views:
+                views[m]['active'] = False
+            views[tab]['active'] = True
+            # Switching tabs re-renders a blank lattice graph
+            views[tab]['frames'].reset()
+            views[tab]['energy_cursor'] = None
             print(f"Activated model: {tab}")
-            return store_data
+            return timer.finish(changed, 'update')
 
-        if 'step-interval' in triggered_ids and store_data[tab]['active']:
+        if 'step-interval' in triggered_ids and views[tab]['active']:
             sim.step(num_steps=1)
-            state = sim.get_current_state()
-
-            sd = store_data[tab]
-            sd['lattice'] = state['lattice'].tolist()
-            sd['energies'] = state['energies'].tolist()
-            sd['current_trial'] = state['current_trial']
-
-            if state['current_trial'] % 10 == 0:
-                sd['snapshots'].append({
-                    'lattice': state['lattice'].tolist(),
-                    'energies': state['energies'].tolist(),
-                    'trial': state['current_trial']
-                })
-
-            store_data[tab] = sd
-            return store_data
+            return timer.finish(changed, 'step')
 
         if any(k in triggered_ids for k in [
             '{"index":"%s","type":"J-intra-slider"}' % tab,
@@ -84,40 +140,29 @@ def register_callbacks(app, models):
             sim.J_inter = J_inter[0]
             sim.T = T_val[0]
 
-            store_data[tab]['constants'].update({
-                'J_intra': sim.J_intra,
-                'J_inter': sim.J_inter,
-                'T': sim.T
-            })
-
             print(f"Updated constants => J_intra={sim.J_intra}, J_inter={sim.J_inter}, T={sim.T}")
-            return store_data
+            return timer.finish(changed, 'update')
 
         if 'play-button' in triggered_ids and play_clicks > 0:
-            store_data[tab]['active'] = True
+            views[tab]['active'] = True
             print(f"Play clicked => Activated: {tab}")
-            return store_data
+            return timer.finish(changed, 'update')
 
         if 'pause-button' in triggered_ids and pause_clicks > 0:
-            store_data[tab]['active'] = False
+            views[tab]['active'] = False
             print(f"Pause clicked => Paused: {tab}")
-            return store_data
+            return timer.finish(changed, 'update')
 
         if 'inject-button' in triggered_ids and inject_clicks and inject_event_val:
             value = event_mapping.get(inject_event_val)
             if callable(value):
                 value = value()
             inject_event(sim.lattice, value, sim.random)
-
-            state = sim.get_current_state()
-            store_data[tab].update({
-                'lattice': state['lattice'].tolist(),
-                'energies': state['energies'].tolist(),
-                'current_trial': state['current_trial']
-            })
+            # Spins changed without a trial, so glyphs keyed on current_trial alone would go stale
+            views[tab]['injections'] += 1
 
             print(f"Injected event '{inject_event}' with strength {value}")
-            return store_data
+            return timer.finish(changed, 'update')
 
         if any("faction-h-slider" in tid for tid in triggered_ids):
             print(f"Updating h_map from faction sliders")
@@ -126,15 +171,12 @@ def register_callbacks(app, models):
                 scaled_h = val * scale_val
                 sim.adjust_constants(faction_id=idx, new_h=scaled_h)
 
-                mask = sim.faction_map == idx
-                avg_spin = sim.lattice[mask].mean()
+                avg_spin = sim.lattice.flat[sim.faction_cells(idx)].mean()
                 print(f"Faction {idx} => avg_spin = {avg_spin:.3f} after h = {scaled_h:.2f}")
 
-            state = sim.get_current_state()
-            store_data[tab]['h_map'] = state['h_map'].tolist()
-            return store_data
+            return timer.finish(changed, 'update')
 
-        return store_data
+        return timer.finish(dash.no_update)
 
     
     @app.callback(
@@ -146,7 +188,7 @@ def register_callbacks(app, models):
         State('model-tabs', 'value')
     )
     def update_play_pause_buttons(store_data, tab_value):
-        active = store_data[tab_value]['active']
+        active = get_session(store_data)['views'][tab_value]['active']
 
         play_disabled = active
         pause_disabled = not active
@@ -230,62 +272,16 @@ def register_callbacks(app, models):
         prevent_initial_call=True
     )
     def render_initial_lattice(tab, glow_data, faction_data, store_data):
-        data = store_data[tab]
+        timer = metrics.start('render_initial_lattice')
+        session = get_session(store_data)
+        data = session['views'][tab]
         glow = glow_data.get('glow', True)
         show_factions = faction_data.get('show_factions', True)
-        lattice = np.array(data['lattice'])
-        borders_x = data['borders_x']
-        borders_y = data['borders_y']
-        colors = color_maps[tab]
+        lattice = session['models'][tab].lattice
 
-        fig = px.imshow(lattice, color_continuous_scale=colors[::-1], origin='lower', zmax=1, zmin=-1)
+        timer.lap('state')
 
-        fig.update_layout(
-            coloraxis_showscale=False,
-            paper_bgcolor=black,
-            plot_bgcolor=black,
-            margin=dict(l=0, r=0, t=0, b=0),
-            xaxis=dict(visible=False, showticklabels=False, showgrid=False),
-            yaxis=dict(visible=False, showticklabels=False, showgrid=False)
-        )
-
-        if show_factions:
-            if glow:
-                for layer in glow_layers:
-                    fig.add_trace(go.Scatter(
-                        x=borders_x,
-                        y=borders_y,
-                        mode='lines',
-                        line=dict(color=f'rgba({blue}, {layer["opacity"]})', width=layer['size'] * 0.7),
-                        hoverinfo='skip',
-                        showlegend=False,
-                        cliponaxis=False
-                    ))
-
-            fig.add_trace(go.Scatter(
-                x=borders_x,
-                y=borders_y,
-                mode='lines',
-                line=dict(color=white, width=1.5),
-                hoverinfo='skip',
-                showlegend=False,
-                cliponaxis=False
-            ))
-
-        else:
-            fig.add_trace(go.Scatter(
-                x=[-0.5, -0.5, lattice.shape[1] - 0.5, lattice.shape[1] - 0.5],
-                y=[-0.5, lattice.shape[0] - 0.5, -0.5, lattice.shape[0] - 0.5],
-                mode='lines',
-                line=dict(width=6, color='rgba(0, 0, 0, 0)'),
-                showlegend=False,
-                hoverinfo='skip'
-            ))
-
-
-        fig.update_traces(opacity=0.75)
-
-        return fig
+        return timer.finish(create_initial_lattice_figure(lattice, data, tab, glow, show_factions), 'figure')
     
     @app.callback(
         Output('model-content','children'),
@@ -293,19 +289,134 @@ def register_callbacks(app, models):
         State('model-store', 'data')
     )
     def render_tab(tab, store_data):
-        state = {
-            'faction_map': store_data[tab]['faction_map'],
-            'h_map': store_data[tab]['h_map']
-        }
-        store_constants = store_data[tab]['constants']
-        return generate_model_layout(tab, state, store_constants)
+        timer = metrics.start('render_tab')
+        sim = get_session(store_data)['models'][tab]
+        state, constants = model_state(sim), model_constants(sim)
+        timer.lap('state')
+
+        return timer.finish(generate_model_layout(tab, state, constants), 'layout')
 
     
+    @app.callback(
+        Output('lattice-plot', 'figure'),
+        Output('lattice-frame', 'data'),
+        Input('model-store', 'data'),
+        Input('glow-store', 'data'),
+        Input('faction-store', 'data'),
+        State('model-tabs', 'value'),
+        State('lattice-frame', 'data'),
+        prevent_initial_call=True
+    )
+    def update_lattice(store_data, glow_data, faction_data, tab, frame_data):
+        timer = metrics.start('update_lattice')
+        triggered_ids = [t['prop_id'].split('.')[0] for t in callback_context.triggered]
+        session = get_session(store_data)
+        sd = session['views'][tab]
+        sim = session['models'][tab]
+        encoder = sd['frames']
+
+        # Toggles change the figure skeleton, so the client needs a fresh keyframe
+        if 'glow-store' in triggered_ids or 'faction-store' in triggered_ids:
+            encoder.reset()
+
+        needs_skeleton = encoder.fresh
+        # lattice-frame is written together with the figure, so it holds the last frame the browser
+        # kept; Dash drops superseded responses, after which the encoder sends a keyframe
+        frame = encoder.encode(sim.lattice, base=(frame_data or {}).get('seq', 0))
+        applied = {'seq': frame['seq']}
+        # Glyphs are unreadable on large lattices, so they are dropped entirely
+        char_map = character_maps[tab] if sim.N <= glyph_max_size else None
+        timer.lap('encode')
+
+        if lattice_render_mode == 'clientside' and not needs_skeleton:
+            if frame['type'] == 'delta' and not frame['index']:
+                return timer.finish((dash.no_update, dash.no_update))
+            frame.update(size=sim.N, glyphs=char_map)
+            return timer.finish((dash.no_update, frame), 'frame')
+
+        if frame['type'] == 'delta':
+            if not frame['index']:
+                return timer.finish((dash.no_update, dash.no_update))
+            return timer.finish((lattice_delta_patch(frame, sim.N, char_map), applied), 'patch')
+
+        glyphs = None
+        if char_map is not None:
+            # Keyed on server-side lattice changes, the store version only counts client round trips
+            glyphs = lattice_glyphs(sd, (sim.current_trial, sd['injections']), sim.lattice, char_map)
+
+        fig_lattice = create_lattice_figure(
+            sim.lattice, sd, tab,
+            glow_data.get('glow', True),
+            faction_data.get('show_factions', True),
+            glyphs
+        )
+        return timer.finish((fig_lattice, applied), 'figure')
+
+    if lattice_render_mode == 'clientside':
+        app.clientside_callback(
+            APPLY_LATTICE_FRAME,
+            Output('lattice-plot', 'figure', allow_duplicate=True),
+            Input('lattice-frame', 'data'),
+            State('lattice-plot', 'figure'),
+            prevent_initial_call=True
+        )
+
+    @app.callback(
+        Output('energy-plot', 'figure'),
+        Output('energy-frame', 'data'),
+        Input('model-store', 'data'),
+        Input('glow-store', 'data'),
+        State('model-tabs', 'value'),
+        State('energy-frame', 'data'),
+        prevent_initial_call=True
+    )
+    def update_energy(store_data, glow_data, tab, frame_data):
+        timer = metrics.start('update_energy')
+        triggered_ids = [t['prop_id'].split('.')[0] for t in callback_context.triggered]
+        session = get_session(store_data)
+        sd = session['views'][tab]
+        sim = session['models'][tab]
+        glow = glow_data.get('glow', True)
+
+        # energy-frame records where the browser's chart ends; if a response was dropped it lags
+        # the cursor, and the gap is closed by a rebuild rather than left in the line
+        if 'glow-store' in triggered_ids or (frame_data or {}).get('end') != sd['energy_cursor']:
+            sd['energy_cursor'] = None
+
+        cursor = sd['energy_cursor']
+        total = len(sim.energies)
+        if cursor is not None and cursor == total:
+            return timer.finish((dash.no_update, dash.no_update))
+
+        scale = sim.lattice.size
+
+        # The history is downsampled into half the window and raw appends fill the
+        # other half before the next rebuild, so the chart always spans the whole run
+        if cursor is None or total - sd['energy_rebuilt_at'] >= energy_window // 2:
+            energies = (np.array(sim.energies) - sim.energies[0]) / scale
+            x, y = lttb(np.arange(total), energies, energy_window // 2)
+            timer.lap('downsample')
+            fig_energy = create_energy_figure(x, y, glow)
+            sd['energy_cursor'] = sd['energy_rebuilt_at'] = total
+            sd['energy_traces'] = len(fig_energy.data)
+            return timer.finish((fig_energy, {'end': total}), 'figure')
+
+        x = list(range(cursor, total))
+        y = [(e - sim.energies[0]) / scale for e in sim.energies[cursor:total]]
+        sd['energy_cursor'] = total
+
+        return timer.finish((dash.no_update, {'x': x, 'y': y, 'end': total, 'traces': sd['energy_traces'], 'window': energy_window}), 'frame')
+
+    app.clientside_callback(
+        EXTEND_ENERGY,
+        Output('energy-plot', 'extendData'),
+        Input('energy-frame', 'data'),
+        prevent_initial_call=True
+    )
+
     @app.callback(
         Output('magnetization-gauge', 'figure'),
         Output('agree-bar', 'figure'),
-        Output('lattice-plot','figure'),
-        Output('energy-plot','figure'),
         Output('faction-plot','figure'),
         Input('model-store','data'),
         Input('glow-store', 'data'),
@@ -314,18 +425,18 @@ def register_callbacks(app, models):
         prevent_initial_call=True
     )
     def update_graphs(store_data, glow_data, faction_data, tab):
-        sd = store_data[tab]
-        lattice = np.array(sd['lattice'])
-        energies = np.array(sd['energies'])
-        energies = energies - energies[0]
-        faction_map = np.array(sd['faction_map'])
+        timer = metrics.start('update_graphs')
+        session = get_session(store_data)
+        models = session['models']
+        sim = models[tab]
 
         colors = color_maps[tab]
-        char_map = character_maps[tab]
         glow = glow_data.get('glow', True)
-        show_factions = faction_data.get('show_factions', True)
 
-        mag = models[tab].get_magnetization()
+        mag = sim.get_magnetization()
+        agreement_score = sim.get_agreement_score()
+        bars = sim.get_spin_percentages()
+        timer.lap('observables')
 
         blue_layers = [
             {"opacity": 0.08, "bar_thickness": 0.575, "line_width": 15,  "threshold_thickness": 0.92},
@@ -413,7 +524,6 @@ def register_callbacks(app, models):
             margin=dict(t=0, b=0, l=20, r=20)
         )
         
-        agreement_score = models[tab].get_agreement_score()
         agreement_score = (agreement_score * 2) - 1
 
         scale = 5
@@ -490,170 +600,6 @@ def register_callbacks(app, models):
             yaxis=dict(range=[0, 1], visible=False, showticklabels=False)
         )
 
-        fig_lattice = px.imshow(lattice,
-                        color_continuous_scale=colors[::-1],
-                        origin='lower',
-                        zmax=1,
-                        zmin=-1)
-
-        
-        fig_lattice.update_layout(
-            coloraxis_showscale=False,
-            paper_bgcolor=f'{black}',
-            plot_bgcolor=f'{black}',
-            font=dict(color=f"{white}", family="Inter, sans-serif", size=12),
-            margin=dict(l=0, r=0, t=0, b=0),
-
-            xaxis=dict(
-                showgrid=False,
-                zeroline=False,
-                showticklabels=False,
-                range=[-0.5, lattice.shape[1]-0.5],
-                visible=False,
-                constrain="domain"
-            ),
-            yaxis=dict(
-                showgrid=False,
-                zeroline=False,
-                showticklabels=False,
-                range=[-0.5, lattice.shape[0]-0.5],
-                visible=False,
-                scaleanchor="x",
-                scaleratio=1
-            ),
-        )
-
-
-        fig_lattice.update_layout(dragmode=False, uirevision='static', modebar_remove=['zoom', 'pan', 'select', 'lasso', 'resetScale2d'])
-
-        borders_x = sd.get('borders_x', [])
-        borders_y = sd.get('borders_y', [])
-
-        if show_factions:
-            if glow:
-                for layer in glow_layers:
-                    fig_lattice.add_trace(go.Scatter(
-                        x=borders_x,
-                        y=borders_y,
-                        mode='lines',
-                        line=dict(
-                            color=f'rgba({blue}, {layer["opacity"]})',
-                            width=layer["size"]
-                        ),
-                        hoverinfo='skip',
-                        showlegend=False
-                    ))
-
-            fig_lattice.add_trace(go.Scatter(
-                x=borders_x,
-                y=borders_y,
-                mode='lines',
-                line=dict(color=f'{white}', width=2),
-                showlegend=False,
-                hoverinfo='skip'
-            ))
-
-            labels = sd.get('labels', [])
-            for x, y, label_num in labels:
-                fig_lattice.add_shape(
-                    type="circle",
-                    xref="x", yref="y",
-                    x0=x-0.7, y0=y-0.7, x1=x+0.7, y1=y+0.7,
-                    line_color=f"{white}",
-                    fillcolor=f"{black}",
-                    opacity=0.5
-                )
-                fig_lattice.add_annotation(
-                    x=x,
-                    y=y,
-                    text=str(label_num),
-                    font=dict(color=f"{white}", size=12),
-                    showarrow=False
-                )
-        else:
-            fig_lattice.add_trace(go.Scatter(
-                x=[-0.5, -0.5, lattice.shape[1] - 0.5, lattice.shape[1] - 0.5],
-                y=[-0.5, lattice.shape[0] - 0.5, -0.5, lattice.shape[0] - 0.5],
-                mode='lines',
-                line=dict(width=6, color='rgba(0, 0, 0, 0)'),
-                showlegend=False,
-                hoverinfo='skip'
-            ))
-
-        text_x = []
-        text_y = []
-        text_values = []
-
-        for r in range(lattice.shape[0]):
-            for c in range(lattice.shape[1]):
-                spin = lattice[r, c]
-                symbol = char_map.get(spin, '')
-                text_x.append(c)
-                text_y.append(r)
-                text_values.append(symbol)
-
-        fig_lattice.add_trace(go.Scatter(
-            x=text_x,
-            y=text_y,
-            text=text_values,
-            mode='text',
-            textfont=dict(color=f'{white}', size=9),
-            opacity=0.4,
-            hoverinfo='skip',
-            showlegend=False
-        ))
-
-        fig_energy = go.Figure()
-
-        if glow:
-
-            for layer in glow_layers:
-                fig_energy.add_trace(go.Scatter(
-                    y=energies,
-                    mode='lines',
-                    line=dict(
-                        color=f'rgba({blue}, {layer["opacity"]})',
-                        width=layer["size"]
-                    ),
-                    hoverinfo='skip',
-                    showlegend=False
-                ))
-
-        fig_energy.add_trace(go.Scatter(
-            y=energies,
-            mode='lines',
-            line=dict(
-                color=f'{white}',
-                width=2
-            ),
-            hoverinfo='skip',
-            name='Energy'
-        ))
-
-
-        fig_energy.update_layout(
-            margin=dict(t=45, b=20, l=20, r=20),
-            paper_bgcolor='rgba(0, 0, 0, 0)', plot_bgcolor='rgba(0, 0, 0, 0)',
-            showlegend=False,
-            font=dict(color=f"{white}", family="Inter, sans-serif", size=12),
-            xaxis_showgrid=False,
-            yaxis_showgrid=False,
-            xaxis=dict(showgrid=False),
-            yaxis=dict(
-                showgrid=False,
-                ticksuffix=' '
-            ))
-        
-        fig_energy.update_layout(dragmode=False, uirevision='static', modebar_remove=['zoom', 'pan', 'select', 'lasso', 'resetScale2d'])
-        
-        faction_map = models[tab].faction_map
-        bars = []
-        for f in np.unique(faction_map):
-            mask = (faction_map==f)
-            total = mask.sum()
-            net   = lattice[mask].sum()
-            bars.append(100*net/total if total else 0)
-
         fig_distribution = px.bar(
             x=list(range(1, len(bars)+1)),
             y=bars,
@@ -677,4 +623,4 @@ def register_callbacks(app, models):
 
         fig_distribution.update_layout(dragmode=False, uirevision='static', modebar_remove=['zoom', 'pan', 'select', 'lasso', 'resetScale2d'])
 
-        return fig_gauge, fig_agree, fig_lattice, fig_energy, fig_distribution
\ No newline at end of file
+        return timer.finish((fig_gauge, fig_agree, fig_distribution), 'figure')
\ No newline at end of file
@@ -1,3 +1,4 @@
+import os
 import numpy as np
 
 color_maps = {
@@ -97,4 +98,29 @@ selected_tab_style = {
     'backgroundColor': 'white',
 }
 
-scale_val = 500
\ No newline at end of file
+scale_val = 500
+
+session_memory_cap = int(os.environ.get('ISING_SESSION_MEMORY_MB', 512)) * 1024 * 1024
+
+session_spill_dir = os.environ.get('ISING_SESSION_SPILL_DIR')
+
+# Spilled sessions not revisited within this many hours are deleted
+session_spill_max_age = float(os.environ.get('ISING_SESSION_SPILL_MAX_HOURS', 24)) * 3600
+
+# Sessions built ahead of time so page loads do not wait on model construction, per worker
+# process. They are not counted against session_memory_cap until a page load claims one.
+session_prewarm = int(os.environ.get('ISING_SESSION_PREWARM', 4))
+
+keyframe_interval = 50
+
+# 'server' patches the lattice figure from Python, 'clientside' applies frames in the browser
+lattice_render_mode = os.environ.get('ISING_LATTICE_RENDER', 'server')
+
+# Maximum number of points drawn on the energy chart
+energy_window = 2000
+
+# Largest lattice side that still gets per-cell +/– style glyphs
+glyph_max_size = 60
+
+# Per-stage callback timings and payload sizes, served as Prometheus text at /metrics
+metrics_enabled = os.environ.get('ISING_METRICS', '0') == '1'
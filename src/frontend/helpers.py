@@ -1,55 +1,289 @@
 import numpy as np
-from dash import html, dcc
+from dash import html, dcc, Patch
 import plotly.graph_objects as go
+import plotly.express as px
 import dash_mantine_components as dmc
 
-from .constants import black
-
-
-def compute_faction_borders(faction_map):
-    N = faction_map.shape[0]
-    x_points = []
-    y_points = []
-    for r in range(N):
-        for c in range(N):
-            curr = faction_map[r, c]
-            for dr, dc in [(0, 1), (1, 0)]:
-                nr, nc = r + dr, c + dc
-                if 0 <= nr < N and 0 <= nc < N:
-                    neighbor = faction_map[nr, nc]
-                    if curr != neighbor:
-                        epsilon = 0.06
-                        offset = 0.5
-                        if dr == 1:  # bottom neighbor (drawing a horizontal border)
-                            if 0 < c < N-1:  # check columns for horizontal borders
-                                x0, x1 = c - epsilon - offset, c + 1 + epsilon - offset
-                            else:  # touching left/right edge
-                                x0, x1 = c - offset, c + 1 - offset
-                            y0 = y1 = r + 1 - offset
-                            x_points += [x0, x1, None]
-                            y_points += [y0, y1, None]
-                        else:  # right neighbor (drawing a vertical border)
-                            if 0 < r < N-1:  # check rows for vertical borders
-                                y0, y1 = r - epsilon - offset, r + 1 + epsilon - offset
-                            else:  # touching top/bottom edge
-                                y0, y1 = r - offset, r + 1 - offset
-                            x0 = x1 = c + 1 - offset
-                            x_points += [x0, x1, None]
-                            y_points += [y0, y1, None]
-
-    return x_points, y_points
+from .constants import black, white, blue, color_maps, glow_layers
+
 
 def compute_faction_labels(faction_map):
+    factions = faction_map.ravel()
+    ys, xs = np.indices(faction_map.shape)
+    counts = np.bincount(factions)
+    sum_x = np.bincount(factions, weights=xs.ravel())
+    sum_y = np.bincount(factions, weights=ys.ravel())
+
     labels = []
-    unique_factions = np.unique(faction_map)
-    for f_id in unique_factions:
-        ys, xs = np.where(faction_map == f_id)
-        if len(xs) > 0:
-            center_x = np.mean(xs)
-            center_y = np.mean(ys)
-            labels.append((center_x, center_y, int(f_id)+1))  # +1 to label 1-indexed
+    for f_id in np.flatnonzero(counts):
+        center_x = sum_x[f_id] / counts[f_id]
+        center_y = sum_y[f_id] / counts[f_id]
+        labels.append((center_x, center_y, int(f_id)+1))  # +1 to label 1-indexed
     return labels
 
+def model_constants(sim):
+    return {
+        "J_intra": sim.J_intra,
+        "J_inter": sim.J_inter,
+        "T": sim.T,
+    }
+
+def cached_figure(sd, key, build):
+    # Skeletons only depend on the view's faction layout and the toggles, so each view keeps
+    # its own; callers get a copy whose data list they can refill without touching the cached traces
+    skeletons = sd.setdefault('skeletons', {})
+    fig = skeletons.get(key)
+    if fig is None:
+        fig = skeletons[key] = build()
+    return {**fig, 'data': list(fig['data'])}
+
+def fill_trace(fig, index, **props):
+    fig['data'][index] = {**fig['data'][index], **props}
+
+def _initial_lattice_skeleton(shape, sd, tab, glow, show_factions):
+    borders_x = sd['borders_x']
+    borders_y = sd['borders_y']
+    colors = color_maps[tab]
+
+    fig = px.imshow(np.zeros(shape), color_continuous_scale=colors[::-1], origin='lower', zmax=1, zmin=-1)
+
+    fig.update_layout(
+        coloraxis_showscale=False,
+        paper_bgcolor=black,
+        plot_bgcolor=black,
+        margin=dict(l=0, r=0, t=0, b=0),
+        xaxis=dict(visible=False, showticklabels=False, showgrid=False),
+        yaxis=dict(visible=False, showticklabels=False, showgrid=False)
+    )
+
+    if show_factions:
+        if glow:
+            for layer in glow_layers:
+                fig.add_trace(go.Scatter(
+                    x=borders_x,
+                    y=borders_y,
+                    mode='lines',
+                    line=dict(color=f'rgba({blue}, {layer["opacity"]})', width=layer['size'] * 0.7),
+                    hoverinfo='skip',
+                    showlegend=False,
+                    cliponaxis=False
+                ))
+
+        fig.add_trace(go.Scatter(
+            x=borders_x,
+            y=borders_y,
+            mode='lines',
+            line=dict(color=white, width=1.5),
+            hoverinfo='skip',
+            showlegend=False,
+            cliponaxis=False
+        ))
+
+    else:
+        fig.add_trace(go.Scatter(
+            x=[-0.5, -0.5, shape[1] - 0.5, shape[1] - 0.5],
+            y=[-0.5, shape[0] - 0.5, -0.5, shape[0] - 0.5],
+            mode='lines',
+            line=dict(width=6, color='rgba(0, 0, 0, 0)'),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
+
+
+    fig.update_traces(opacity=0.75)
+
+    return fig.to_plotly_json()
+
+def create_initial_lattice_figure(lattice, sd, tab, glow, show_factions):
+    key = ('initial', glow, show_factions)
+    fig = cached_figure(sd, key, lambda: _initial_lattice_skeleton(lattice.shape, sd, tab, glow, show_factions))
+    fill_trace(fig, 0, z=lattice.tolist())
+    return fig
+
+def _lattice_skeleton(shape, sd, tab, glow, show_factions, show_glyphs):
+    colors = color_maps[tab]
+
+    fig_lattice = px.imshow(np.zeros(shape),
+                    color_continuous_scale=colors[::-1],
+                    origin='lower',
+                    zmax=1,
+                    zmin=-1)
+
+
+    fig_lattice.update_layout(
+        coloraxis_showscale=False,
+        paper_bgcolor=f'{black}',
+        plot_bgcolor=f'{black}',
+        font=dict(color=f"{white}", family="Inter, sans-serif", size=12),
+        margin=dict(l=0, r=0, t=0, b=0),
+
+        xaxis=dict(
+            showgrid=False,
+            zeroline=False,
+            showticklabels=False,
+            range=[-0.5, shape[1]-0.5],
+            visible=False,
+            constrain="domain"
+        ),
+        yaxis=dict(
+            showgrid=False,
+            zeroline=False,
+            showticklabels=False,
+            range=[-0.5, shape[0]-0.5],
+            visible=False,
+            scaleanchor="x",
+            scaleratio=1
+        ),
+    )
+
+
+    fig_lattice.update_layout(dragmode=False, uirevision='static', modebar_remove=['zoom', 'pan', 'select', 'lasso', 'resetScale2d'])
+
+    borders_x = sd.get('borders_x', [])
+    borders_y = sd.get('borders_y', [])
+
+    if show_factions:
+        if glow:
+            for layer in glow_layers:
+                fig_lattice.add_trace(go.Scatter(
+                    x=borders_x,
+                    y=borders_y,
+                    mode='lines',
+                    line=dict(
+                        color=f'rgba({blue}, {layer["opacity"]})',
+                        width=layer["size"]
+                    ),
+                    hoverinfo='skip',
+                    showlegend=False
+                ))
+
+        fig_lattice.add_trace(go.Scatter(
+            x=borders_x,
+            y=borders_y,
+            mode='lines',
+            line=dict(color=f'{white}', width=2),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
+
+        labels = sd.get('labels', [])
+        for x, y, label_num in labels:
+            fig_lattice.add_shape(
+                type="circle",
+                xref="x", yref="y",
+                x0=x-0.7, y0=y-0.7, x1=x+0.7, y1=y+0.7,
+                line_color=f"{white}",
+                fillcolor=f"{black}",
+                opacity=0.5
+            )
+            fig_lattice.add_annotation(
+                x=x,
+                y=y,
+                text=str(label_num),
+                font=dict(color=f"{white}", size=12),
+                showarrow=False
+            )
+    else:
+        fig_lattice.add_trace(go.Scatter(
+            x=[-0.5, -0.5, shape[1] - 0.5, shape[1] - 0.5],
+            y=[-0.5, shape[0] - 0.5, -0.5, shape[0] - 0.5],
+            mode='lines',
+            line=dict(width=6, color='rgba(0, 0, 0, 0)'),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
+
+    if show_glyphs:
+        fig_lattice.update_traces(
+            selector=dict(type='heatmap'),
+            texttemplate='%{text}',
+            textfont=dict(color='rgba(229, 229, 229, 0.4)', size=9)
+        )
+
+    return fig_lattice.to_plotly_json()
+
+def create_lattice_figure(lattice, sd, tab, glow, show_factions, glyphs=None):
+    show_glyphs = glyphs is not None
+    key = ('lattice', glow, show_factions, show_glyphs)
+    fig = cached_figure(sd, key, lambda: _lattice_skeleton(lattice.shape, sd, tab, glow, show_factions, show_glyphs))
+
+    # z and text stay nested lists so later patches can address single cells
+    if show_glyphs:
+        fill_trace(fig, 0, z=lattice.tolist(), text=glyphs)
+    else:
+        fill_trace(fig, 0, z=lattice.tolist())
+    return fig
+
+def lattice_glyphs(sd, version, lattice, char_map):
+    if sd.get('glyph_version') != version:
+        sd['glyphs'] = np.where(lattice > 0, char_map[1], char_map[-1]).tolist()
+        sd['glyph_version'] = version
+    return sd['glyphs']
+
+def create_energy_figure(x, y, glow):
+    fig_energy = go.Figure()
+
+    if glow:
+
+        for layer in glow_layers:
+            fig_energy.add_trace(go.Scatter(
+                x=x,
+                y=y,
+                mode='lines',
+                line=dict(
+                    color=f'rgba({blue}, {layer["opacity"]})',
+                    width=layer["size"]
+                ),
+                hoverinfo='skip',
+                showlegend=False
+            ))
+
+    fig_energy.add_trace(go.Scatter(
+        x=x,
+        y=y,
+        mode='lines',
+        line=dict(
+            color=f'{white}',
+            width=2
+        ),
+        hoverinfo='skip',
+        name='Energy'
+    ))
+
+
+    fig_energy.update_layout(
+        margin=dict(t=45, b=20, l=20, r=20),
+        paper_bgcolor='rgba(0, 0, 0, 0)', plot_bgcolor='rgba(0, 0, 0, 0)',
+        showlegend=False,
+        font=dict(color=f"{white}", family="Inter, sans-serif", size=12),
+        xaxis_showgrid=False,
+        yaxis_showgrid=False,
+        xaxis=dict(showgrid=False),
+        yaxis=dict(
+            showgrid=False,
+            ticksuffix=' '
+        ))
+
+    fig_energy.update_layout(dragmode=False, uirevision='static', modebar_remove=['zoom', 'pan', 'select', 'lasso', 'resetScale2d'])
+
+    return fig_energy
+
+def lattice_delta_patch(frame, N, char_map=None):
+    patched = Patch()
+    for idx, value in zip(frame['index'], frame['values']):
+        r, c = divmod(idx, N)
+        patched['data'][0]['z'][r][c] = value
+        if char_map is not None:
+            patched['data'][0]['text'][r][c] = char_map[value]
+    return patched
+
+def model_state(sim):
+    return {
+        "faction_map": sim.faction_map,
+        "h_map": sim.h_map,
+        "h_values": list(sim.h_values),
+    }
+
 def create_faction_h_sliders(sim):
     sliders = []
 
@@ -1,14 +1,13 @@
 from dash import dcc, html
 import dash_mantine_components as dmc
-import numpy as np
 
 from .constants import black, white, blue, tab_style, event_options, gauge_titles, agreement_titles, spin_distribution_titles, selected_tab_style, scale_val
-from .helpers import create_blank_figure, inject_button_style, button_style
+from .helpers import create_blank_figure, inject_button_style, button_style, model_constants, model_state
 
-def create_app_layout(initial_store):
+def create_app_layout(session_id, models):
     default_model = 'Ferromagnet'
-    state = initial_store[default_model]['state']
-    constants = initial_store[default_model]['constants']
+    state = model_state(models[default_model])
+    constants = model_constants(models[default_model])
 
     return dmc.MantineProvider(
         theme={"colorScheme": "dark"},
@@ -53,7 +52,10 @@ def create_app_layout(initial_store):
                 ),
 
                 # Other stores and interval
-                dcc.Store(id='model-store', data=initial_store,storage_type='memory'),
+                # Simulation state lives server-side; the store only carries a handle and a change counter
+                dcc.Store(id='model-store', data={'session_id': session_id, 'version': 0}, storage_type='memory'),
+                dcc.Store(id='lattice-frame', storage_type='memory'),
+                dcc.Store(id='energy-frame', storage_type='memory'),
                 dcc.Store(id='glow-store', data={'glow': True}, storage_type='memory'),
                 dcc.Store(id='faction-store', data={'show_factions': True}, storage_type='memory'),
                 dcc.Interval(id='step-interval', interval=400, n_intervals=0)
@@ -244,9 +246,7 @@ def generate_model_layout(model_name, state, store_constants):
                                     min=-1,
                                     max=1,
                                     step=0.05,
-                                    value = round(np.array(state['h_map'])[np.array(state['faction_map']) == i][0] / scale_val, 2) 
-                                                  if np.array(state['h_map'])[np.array(state['faction_map']) == i].size > 0 
-                                                  else 0.0,
+                                    value=round(state['h_values'][i] / scale_val, 2),
                                     marks=[
                                         {"value": -1, "label": "-1"},
                                         {"value": 0.0, "label": "0"},
@@ -256,7 +256,7 @@ def generate_model_layout(model_name, state, store_constants):
                                     size="lg",
                                     style={'marginBottom': '20px'}
                                 )
-                            ]) for i in range(len(np.unique(state['faction_map'])))
+                            ]) for i in range(len(state['h_values']))
                         ], style={
                             'backgroundColor': f'{black}',
                             'color': f'{white}',
@@ -0,0 +1,99 @@
+import threading
+import time
+from bisect import bisect_left
+
+import dash
+from plotly.io.json import to_json_plotly
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(k, list(v[0]), v[1], v[2]) for k, v in sorted(self._series.items())]
+
+        for label_values, counts, total, count in snapshot:
+            labels = ','.join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return '\n'.join(lines)
+
+
+# Splits one callback invocation into consecutive stages, each lap() closes the stage that just ran
+class CallbackTimer:
+    def __init__(self, metrics, callback):
+        self.metrics = metrics
+        self.callback = callback
+        self.started = self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.metrics.stage_seconds.observe(now - self.last, self.callback, stage)
+        self.last = now
+
+    def finish(self, result, stage=None):
+        if stage is not None:
+            self.lap(stage)
+        # Dash serializes the return value after we hand it back, so repeat that here to time and
+        # size it. Outputs left at no_update are never sent and are skipped.
+        outputs = list(result) if isinstance(result, tuple) else [result]
+        outputs = [o for o in outputs if o is not dash.no_update]
+        if outputs:
+            payload = to_json_plotly(outputs if isinstance(result, tuple) else outputs[0])
+            self.lap('serialize')
+            self.metrics.payload_bytes.observe(len(payload), self.callback)
+        self.metrics.callback_seconds.observe(time.perf_counter() - self.started, self.callback)
+        return result
+
+
+class NullTimer:
+    def lap(self, stage):
+        pass
+
+    def finish(self, result, stage=None):
+        return result
+
+
+class Metrics:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.callback_seconds = Histogram(
+            'ising_callback_seconds', "Wall time per callback invocation.", SECONDS_BUCKETS, ('callback',))
+        self.stage_seconds = Histogram(
+            'ising_callback_stage_seconds', "Wall time per callback stage.", SECONDS_BUCKETS, ('callback', 'stage'))
+        self.payload_bytes = Histogram(
+            'ising_callback_payload_bytes', "Serialized size of the callback output.", BYTES_BUCKETS, ('callback',))
+
+    def start(self, callback):
+        return CallbackTimer(self, callback) if self.enabled else NullTimer()
+
+    def render(self):
+        return '\n'.join(h.render() for h in (self.callback_seconds, self.stage_seconds, self.payload_bytes)) + '\n'
+
+    def register(self, server, path='/metrics'):
+        server.add_url_rule(path, 'metrics', lambda: (self.render(), 200, {'Content-Type': 'text/plain; version=0.0.4'}))
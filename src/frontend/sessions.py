@@ -0,0 +1,187 @@
+import os
+import pickle
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+SPILL_PRUNE_INTERVAL = 60
+
+def session_memory_usage(session):
+    return sum(model.memory_usage() for model in session['models'].values())
+
+class SessionPool:
+    def __init__(self, factory, max_bytes, spill_dir=None, prewarm=0, spill_max_age=24 * 3600):
+        self.factory = factory
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.prewarm = prewarm
+        self.spill_max_age = spill_max_age
+        self._sessions = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._pruned_at = 0.0
+        # Evicted sessions stay reachable here until their pickle is on disk
+        self._spilling = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+        # Ready-made sessions for page loads, topped up by a background thread. Queued sessions
+        # are not counted against max_bytes; at most `prewarm` of them exist per process.
+        self._ready = queue.Queue(maxsize=prewarm)
+        self._filler_pid = None
+
+    def _start_filler(self):
+        # Threads do not survive fork (gunicorn --preload imports the app in the master),
+        # so each worker process starts its own filler on its first page load
+        if self.prewarm <= 0 or self._filler_pid == os.getpid():
+            return
+        with self._lock:
+            if self._filler_pid == os.getpid():
+                return
+            self._filler_pid = os.getpid()
+            self._ready = queue.Queue(maxsize=self.prewarm)
+            threading.Thread(target=self._fill_ready, args=(self._ready,), daemon=True).start()
+
+    def _fill_ready(self, ready):
+        while True:
+            # put() blocks while the queue is full, so this only runs after a page load takes one
+            ready.put(self.factory())
+
+    def create(self):
+        self._start_filler()
+        session_id = uuid.uuid4().hex
+        try:
+            session = self._ready.get_nowait()
+        except queue.Empty:
+            session = self.factory()
+        with self._lock:
+            evicted = self._insert(session_id, session)
+        self._spill_all(evicted)
+        return session_id, session
+
+    def get(self, session_id):
+        # Ids come from the browser. Anything create() did not hand out, or that has expired,
+        # gets None and nothing is stored under it; callers start a session with create().
+        if not self._valid_id(session_id):
+            return None
+        while True:
+            with self._lock:
+                session = self._sessions.get(session_id) or self._spilling.get(session_id, (None, None))[0]
+                if session is not None:
+                    evicted = self._insert(session_id, session)
+                    break
+                # Only one request restores a given session, the others wait for it
+                loading = self._loading.get(session_id)
+                if loading is None:
+                    loading = self._loading[session_id] = threading.Event()
+                    break
+            loading.wait()
+
+        if session is None:
+            # Disk reads and model construction happen outside the lock so other sessions are not held up
+            try:
+                session = self._load(session_id)
+                if session is None:
+                    return None
+                with self._lock:
+                    evicted = self._insert(session_id, session)
+            finally:
+                with self._lock:
+                    del self._loading[session_id]
+                loading.set()
+
+        self._spill_all(evicted)
+        return session
+
+    def memory_usage(self):
+        with self._lock:
+            return self._total_bytes
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _insert(self, session_id, session):
+        # Caller holds the lock; evicted sessions are returned so they can be spilled after releasing it
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        # A running total, summing every session's size here would cost O(sessions) per request
+        size = session_memory_usage(session)
+        self._total_bytes += size - self._sizes.get(session_id, 0)
+        self._sizes[session_id] = size
+        self._spilling.pop(session_id, None)
+
+        evicted = []
+        # Never evict the session that is being served right now
+        while self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+            old_id, old_session = self._sessions.popitem(last=False)
+            self._total_bytes -= self._sizes.pop(old_id)
+            if self.spill_dir:
+                # The token tells this eviction apart from a later one of the same session
+                token = object()
+                self._spilling[old_id] = (old_session, token)
+                evicted.append((old_id, old_session, token))
+        return evicted
+
+    def _spill_all(self, evicted):
+        for session_id, session, token in evicted:
+            tmp_path = self._spill(session_id, session)
+            with self._lock:
+                current = self._spilling.get(session_id)
+                # Only the latest eviction is published; a session revived meanwhile keeps no file
+                if current is not None and current[1] is token:
+                    os.replace(tmp_path, self._spill_path(session_id))
+                    del self._spilling[session_id]
+                else:
+                    os.remove(tmp_path)
+        if evicted:
+            self._prune_spills()
+
+    def _prune_spills(self):
+        # Spill files of abandoned sessions are never loaded again, so they are dropped once stale
+        now = time.time()
+        if now - self._pruned_at < SPILL_PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.endswith(('.pkl', '.tmp')) and now - entry.stat().st_mtime > self.spill_max_age:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def _valid_id(session_id):
+        # Only what create() could have made, which also keeps ids safe to use as file names
+        return isinstance(session_id, str) and len(session_id) == 32 and all(ch in '0123456789abcdef' for ch in session_id)
+
+    def _spill_path(self, session_id):
+        return os.path.join(self.spill_dir, f"{session_id}.pkl")
+
+    def _spill(self, session_id, session):
+        # Pickled to a temporary file, _spill_all renames it into place so a load never sees a partial write
+        tmp_path = f"{self._spill_path(session_id)}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(session, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return tmp_path
+
+    def _load(self, session_id):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(session_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.spill_max_age:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                session = pickle.load(f)
+            os.remove(path)
+        except FileNotFoundError:
+            # Never spilled, or pruned meanwhile
+            return None
+        return session
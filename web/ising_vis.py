@@ -94,36 +94,23 @@ white = "rgb(229, 229, 229)"
 
 def compute_faction_borders(faction_map):
     N = faction_map.shape[0]
-    x_points = []
-    y_points = []
-    for r in range(N):
-        for c in range(N):
-            curr = faction_map[r, c]
-            for dr, dc in [(0, 1), (1, 0)]:
-                nr, nc = r + dr, c + dc
-                if 0 <= nr < N and 0 <= nc < N:
-                    neighbor = faction_map[nr, nc]
-                    if curr != neighbor:
-                        epsilon = 0.06
-                        offset = 0.5
-                        if dr == 1:  # bottom neighbor (drawing a horizontal border)
-                            if 0 < c < N-1:  # check columns for horizontal borders
-                                x0, x1 = c - epsilon - offset, c + 1 + epsilon - offset
-                            else:  # touching left/right edge
-                                x0, x1 = c - offset, c + 1 - offset
-                            y0 = y1 = r + 1 - offset
-                            x_points += [x0, x1, None]
-                            y_points += [y0, y1, None]
-                        else:  # right neighbor (drawing a vertical border)
-                            if 0 < r < N-1:  # check rows for vertical borders
-                                y0, y1 = r - epsilon - offset, r + 1 + epsilon - offset
-                            else:  # touching top/bottom edge
-                                y0, y1 = r - offset, r + 1 - offset
-                            x0 = x1 = c + 1 - offset
-                            x_points += [x0, x1, None]
-                            y_points += [y0, y1, None]
-
-    return x_points, y_points
+    epsilon = 0.06
+    offset = 0.5
+
+    # Horizontal borders sit between a cell and its bottom neighbour
+    rows, cols = np.nonzero(faction_map[:-1, :] != faction_map[1:, :])
+    inner = ((cols > 0) & (cols < N - 1)) * epsilon
+    h_x = np.column_stack([cols - inner - offset, cols + 1 + inner - offset, np.full(len(cols), np.nan)])
+    h_y = np.column_stack([rows + 1 - offset, rows + 1 - offset, np.full(len(rows), np.nan)])
+
+    # Vertical borders sit between a cell and its right neighbour
+    rows, cols = np.nonzero(faction_map[:, :-1] != faction_map[:, 1:])
+    inner = ((rows > 0) & (rows < N - 1)) * epsilon
+    v_x = np.column_stack([cols + 1 - offset, cols + 1 - offset, np.full(len(cols), np.nan)])
+    v_y = np.column_stack([rows - inner - offset, rows + 1 + inner - offset, np.full(len(rows), np.nan)])
+
+    # NaN breaks the line between segments, like None did in plain lists
+    return np.concatenate([h_x.ravel(), v_x.ravel()]), np.concatenate([h_y.ravel(), v_y.ravel()])
 
 def compute_faction_labels(faction_map):
     labels = []